@@ -2,9 +2,10 @@ from typing import List
 from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase, BuildingYearCategory
 from Topology_Generator.GeoDataNetworkParser import GeoDataNetworkParser
 from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
-from shapely import STRtree, dwithin, Point, distance, touches
+from shapely import STRtree, Point, distance
 import geopandas
 import numpy as np
+import shapely
 
 from Topology_Generator.NetworkParser import StationStartingLinesContainer
 from Topology_Generator.dataclasses import NavigationLineString
@@ -12,25 +13,29 @@ from Topology_Generator.dataclasses import NavigationLineString
 class AllianderGeoDataNetworkParser(GeoDataNetworkParser):
 
     def remove_duplicate_and_non_connected_lines(self, station : Point, ret_val : List[NavigationLineString]):
-        to_clean = []
-        for i, navigation_line_string in enumerate(ret_val):
-            for j in range(i, len(ret_val)):
-                navigation_line_string_a = ret_val[i]
-                navigation_line_string_b = ret_val[j]
-                coord_a_connected_point = GeometryHelperFunctions.get_connected_coords(navigation_line_string_a)
-                coord_b_end_point = GeometryHelperFunctions.get_end_coords(navigation_line_string_b)
-                coord_a_end_point = GeometryHelperFunctions.get_end_coords(navigation_line_string_a)
-                coord_b_connected_point = GeometryHelperFunctions.get_connected_coords(navigation_line_string_b)
-
-                if touches(Point(coord_a_connected_point), Point(coord_b_end_point)) or touches(Point(coord_a_end_point), Point(coord_b_connected_point)):
-                    if distance(Point(coord_a_connected_point), station) < distance(Point(coord_b_connected_point), station):
-                        to_clean.append(navigation_line_string_b)
-                    else:
-                        to_clean.append(navigation_line_string_a)
-
-        for navigation_line_string in to_clean:
-            if navigation_line_string in ret_val:
-                ret_val.remove(navigation_line_string)
+        connected_coords = [GeometryHelperFunctions.get_connected_coords(navigation_line_string) for navigation_line_string in ret_val]
+        end_coords = [GeometryHelperFunctions.get_end_coords(navigation_line_string) for navigation_line_string in ret_val]
+        station_coords = np.array([station.x, station.y])
+        connected_distances = np.sqrt(np.sum((np.array(connected_coords, dtype=float).reshape(-1, 2) - station_coords) ** 2, axis=1))
+
+        line_indices_by_end_coord : dict[tuple, List[int]] = {}
+        for i, end_coord in enumerate(end_coords):
+            line_indices_by_end_coord.setdefault(end_coord, []).append(i)
+
+        # A pair of different lines is a duplicate when the connected point of one coincides with the end point of the other,
+        # a closed line is not a duplicate of itself
+        duplicate_pairs = set()
+        for i, connected_coord in enumerate(connected_coords):
+            for j in line_indices_by_end_coord.get(connected_coord, []):
+                if i != j:
+                    duplicate_pairs.add((min(i, j), max(i, j)))
+
+        # Of every pair the line that connects closest to the station is kept
+        to_clean = set()
+        for i, j in duplicate_pairs:
+            to_clean.add(j if connected_distances[i] < connected_distances[j] else i)
+
+        ret_val[:] = [navigation_line_string for i, navigation_line_string in enumerate(ret_val) if i not in to_clean]
 
     def extract_lines_connected_to_2d_entity2(self, str_tree_lines : STRtree, touch_margin : float, station : Point) -> List[NavigationLineString]:
         ret_val = []
@@ -50,76 +55,82 @@ class AllianderGeoDataNetworkParser(GeoDataNetworkParser):
         self.remove_duplicate_and_non_connected_lines(station, ret_val)
         return ret_val
     
-    def extract_lines_connected_to_2d_entity_one_side_connected(self, str_tree_lines : STRtree, touch_margin : float, station : Point) -> List[NavigationLineString]:
-        ret_val = []
-        line_indices = str_tree_lines.query(station, 'dwithin', touch_margin)
-        for index in line_indices:
-            line = str_tree_lines.geometries.take(index)
-            amount_of_lines_connecting_first_point = str_tree_lines.query(Point(line.coords[0]), 'touches').size
-            amount_of_lines_connecting_last_point = str_tree_lines.query(Point(line.coords[-1]), 'touches').size
-            if not (amount_of_lines_connecting_first_point > 1 and amount_of_lines_connecting_last_point > 1):
-                
-                first_point_touches_station = amount_of_lines_connecting_first_point == 1
-                last_point_touches_station = amount_of_lines_connecting_last_point == 1
-                if not (first_point_touches_station and last_point_touches_station):
-                    ret_val.append(NavigationLineString(line, not first_point_touches_station, index))
-
+    def _extract_lines_connected_to_stations(self, stations : np.ndarray, str_tree_lines : STRtree, touch_margin : float, include_both_sides_disconnected : bool) -> List[List[NavigationLineString]]:
+        ret_val = [[] for _ in range(len(stations))]
+        if len(stations) == 0:
+            return ret_val
+        line_incidence_index = self.get_line_incidence_index(str_tree_lines)
+        line_store = self.get_line_store(str_tree_lines)
+        station_indices, line_indices = str_tree_lines.query(stations, 'dwithin', touch_margin)
+        amount_of_lines_connecting_first_point = line_incidence_index.endpoint_degrees[line_indices, 0]
+        amount_of_lines_connecting_last_point = line_incidence_index.endpoint_degrees[line_indices, 1]
+        not_connected_on_both_sides = ~((amount_of_lines_connecting_first_point > 1) & (amount_of_lines_connecting_last_point > 1))
+
+        if include_both_sides_disconnected:
+            station_coords = np.stack([shapely.get_x(stations), shapely.get_y(stations)], axis=1)[station_indices]
+            first_coords = line_store.start_coords[line_indices]
+            last_coords = line_store.end_coords[line_indices]
+            first_point_touches_station = GeometryHelperFunctions.points_are_close_vectorized(first_coords, station_coords, touch_margin)
+            last_point_touches_station = GeometryHelperFunctions.points_are_close_vectorized(last_coords, station_coords, touch_margin)
+            dis_station_first_coord = np.sqrt(np.sum((first_coords - station_coords) ** 2, axis=1))
+            dis_station_last_coord = np.sqrt(np.sum((last_coords - station_coords) ** 2, axis=1))
+            # When both points touch the station the line is connected with the point closest to the station
+            first_point_end = np.where(first_point_touches_station & last_point_touches_station, dis_station_first_coord > dis_station_last_coord, ~first_point_touches_station)
+            include = not_connected_on_both_sides & (first_point_touches_station | last_point_touches_station)
+        else:
+            first_point_touches_station = amount_of_lines_connecting_first_point == 1
+            last_point_touches_station = amount_of_lines_connecting_last_point == 1
+            first_point_end = ~first_point_touches_station
+            include = not_connected_on_both_sides & ~(first_point_touches_station & last_point_touches_station)
+
+        for station_index, index, point_end in zip(station_indices[include].tolist(), line_indices[include].tolist(), first_point_end[include].tolist()):
+            ret_val[station_index].append(NavigationLineString.from_line_store(line_store, index, point_end))
         return ret_val
 
-    def extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self, str_tree_lines : STRtree, touch_margin : float, station : Point) -> List[NavigationLineString]:
-        ret_val = []
-        line_indices = str_tree_lines.query(station, 'dwithin', touch_margin)
-        for index in line_indices:
-            line = str_tree_lines.geometries.take(index)
-            amount_of_lines_connecting_first_point = str_tree_lines.query(Point(line.coords[0]), 'touches').size
-            amount_of_lines_connecting_last_point = str_tree_lines.query(Point(line.coords[-1]), 'touches').size
-            if not (amount_of_lines_connecting_first_point > 1 and amount_of_lines_connecting_last_point > 1):
-                
-                first_point_touches_station = GeometryHelperFunctions.points_are_close(line.coords[0], (station.x, station.y), touch_margin) 
-                last_point_touches_station = GeometryHelperFunctions.points_are_close(line.coords[-1], (station.x, station.y), touch_margin) 
-                if first_point_touches_station and last_point_touches_station:
-                    dis_station_first_coord = distance(Point(line.coords[0]), station)
-                    dis_station_last_coord = distance(Point(line.coords[-1]), station)
-                    ret_val.append(NavigationLineString(line, dis_station_first_coord > dis_station_last_coord, index))
-                elif first_point_touches_station or last_point_touches_station:
-                    ret_val.append(NavigationLineString(line, not first_point_touches_station, index))
+    def extract_lines_connected_to_2d_entity_one_side_connected(self, str_tree_lines : STRtree, touch_margin : float, station : Point) -> List[NavigationLineString]:
+        return self._extract_lines_connected_to_stations(np.array([station]), str_tree_lines, touch_margin, False)[0]
 
-        return ret_val
+    def extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self, str_tree_lines : STRtree, touch_margin : float, station : Point) -> List[NavigationLineString]:
+        return self._extract_lines_connected_to_stations(np.array([station]), str_tree_lines, touch_margin, True)[0]
 
-    def extract_lines_connected_to_stations_include_both_sides_disconnected(self, station_geo_df : geopandas.GeoDataFrame, str_tree_lines : STRtree, touch_margin : float) -> List[StationStartingLinesContainer]:
-        ret_val = []
-        for station in station_geo_df.geometry:
-            lines_intersecting_with_station = self.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(str_tree_lines, touch_margin, station)
-            building_year = self.get_building_year_of_building_at_point(station)
-            ret_val.append(StationStartingLinesContainer(lines_intersecting_with_station, building_year))
-        return ret_val
+    def extract_lines_connected_to_stations_include_both_sides_disconnected(self, station_geo_df : geopandas.GeoDataFrame, str_tree_lines : STRtree, touch_margin : float, building_years : np.ndarray) -> List[StationStartingLinesContainer]:
+        lines_per_station = self._extract_lines_connected_to_stations(station_geo_df.geometry.to_numpy(), str_tree_lines, touch_margin, True)
+        return [StationStartingLinesContainer(lines_intersecting_with_station, int(building_year)) for lines_intersecting_with_station, building_year in zip(lines_per_station, building_years)]
     
-    def extract_lines_connected_to_stations_include_one_side_connected(self, station_geo_df : geopandas.GeoDataFrame, str_tree_lines : STRtree, touch_margin : float) -> List[StationStartingLinesContainer]:
-        ret_val = []
-        for station in station_geo_df.geometry:
-            lines_intersecting_with_station = self.extract_lines_connected_to_2d_entity_one_side_connected(str_tree_lines, touch_margin, station)
-            building_year = self.get_building_year_of_building_at_point(station)
-            ret_val.append(StationStartingLinesContainer(lines_intersecting_with_station, building_year))
-        return ret_val
+    def extract_lines_connected_to_stations_include_one_side_connected(self, station_geo_df : geopandas.GeoDataFrame, str_tree_lines : STRtree, touch_margin : float, building_years : np.ndarray) -> List[StationStartingLinesContainer]:
+        lines_per_station = self._extract_lines_connected_to_stations(station_geo_df.geometry.to_numpy(), str_tree_lines, touch_margin, False)
+        return [StationStartingLinesContainer(lines_intersecting_with_station, int(building_year)) for lines_intersecting_with_station, building_year in zip(lines_per_station, building_years)]
     
+    def _get_mv_lines_connected_to_mv_lv_station(self, station_index : int) -> List[NavigationLineString]:
+        key = ("mv", station_index)
+        if key not in self.lv_mv_station_lines_cache:
+            station = self.geo_df_lv_mv_station.geometry.iloc[station_index]
+            self.lv_mv_station_lines_cache[key] = self.extract_lines_connected_to_2d_entity_one_side_connected(self.str_tree_mv_lines, 3.0, station)
+        return self.lv_mv_station_lines_cache[key]
+
     def extract_mv_lines_connected_to_mv_lv_station_at_point(self, point : Point) -> List[NavigationLineString]:
-        for station in self.geo_df_lv_mv_station.geometry:
-            if dwithin(station, point, 3.0):
-                return self.extract_lines_connected_to_2d_entity_one_side_connected(self.str_tree_mv_lines, 3.0, station)
-        return []
+        station_index = self.get_lv_mv_station_index_at_point(point, 3.0)
+        if station_index == -1:
+            return []
+        return list(self._get_mv_lines_connected_to_mv_lv_station(station_index))
     
     def extract_lv_lines_connected_to_mv_lv_station_at_point(self, point : Point) -> List[NavigationLineString]:
-        for station in self.geo_df_lv_mv_station.geometry:
-            if dwithin(station, point, 10.0):
-                return self.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self.str_tree_lv_lines, 10.0, station)
-        return []
+        station_index = self.get_lv_mv_station_index_at_point(point, 10.0)
+        if station_index == -1:
+            return []
+        key = ("lv", station_index)
+        if key not in self.lv_mv_station_lines_cache:
+            station = self.geo_df_lv_mv_station.geometry.iloc[station_index]
+            self.lv_mv_station_lines_cache[key] = self.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self.str_tree_lv_lines, 10.0, station)
+        return list(self.lv_mv_station_lines_cache[key])
 
     def extract_mv_lines_that_are_connected_at_point(self, point : Point):
         ret_val = self.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self.str_tree_mv_lines, 1.0, point)
         return ret_val
 
     def extract_lv_lines_connected_to_mv_lv_station(self) -> List[StationStartingLinesContainer]:
-        return self.extract_lines_connected_to_stations_include_both_sides_disconnected(self.geo_df_lv_mv_station, self.str_tree_lv_lines, 3.0)
+        geo_df_stations, building_years = self.get_starting_lv_mv_stations()
+        return self.extract_lines_connected_to_stations_include_both_sides_disconnected(geo_df_stations, self.str_tree_lv_lines, 3.0, building_years)
 
     def extract_lv_lines_connected_at_point(self, point : Point):
         return self.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(self.str_tree_mv_lines, 3.0, point)
@@ -132,30 +143,49 @@ class AllianderGeoDataNetworkParser(GeoDataNetworkParser):
             ret_val = self.extract_lines_connected_to_2d_entity_one_side_connected(self.str_tree_mv_lines, 20.0, Point(station_point.x, station_point.y))
         return ret_val
     
+    def _get_navigation_line_strings_end_points(self, input : List[NavigationLineString]):
+        line_indices = np.array([navigation_line_string.index for navigation_line_string in input], dtype=np.int64)
+        return shapely.points(self.mv_line_store.start_coords[line_indices]), shapely.points(self.mv_line_store.end_coords[line_indices])
+
+    def _get_navigation_line_strings_connected_to_building_mask(self, input : List[NavigationLineString]) -> np.ndarray:
+        first_points, last_points = self._get_navigation_line_strings_end_points(input)
+        building_years = self.get_building_years_of_buildings_at_points(np.concatenate([first_points, last_points]))
+        return (building_years[:len(input)] != 1) | (building_years[len(input):] != 1)
+
+    def _get_navigation_line_strings_connected_to_mv_station_mask(self, input : List[NavigationLineString]) -> np.ndarray:
+        first_points, last_points = self._get_navigation_line_strings_end_points(input)
+        station_indices = self.get_lv_mv_station_indices_at_points(np.concatenate([first_points, last_points]), 3.0)
+        station_has_mv_lines = {station_index : len(self._get_mv_lines_connected_to_mv_lv_station(station_index)) > 0 for station_index in np.unique(station_indices[station_indices != -1]).tolist()}
+        connected_to_mv_station = np.array([station_has_mv_lines.get(station_index, False) for station_index in station_indices.tolist()], dtype=bool)
+        return connected_to_mv_station[:len(input)] | connected_to_mv_station[len(input):]
+
     def remove_navigation_line_strings_not_connected_to_building(self, input : List[NavigationLineString]):
-        items_to_remove = [navigation_line_string for navigation_line_string in input if self.get_building_year_of_building_at_point(Point(navigation_line_string.line_string.coords[0])) == 1 and self.get_building_year_of_building_at_point(Point(navigation_line_string.line_string.coords[-1])) == 1]
-        for navigation_line in items_to_remove:
-            input.remove(navigation_line)
+        if len(input) > 0:
+            keep = self._get_navigation_line_strings_connected_to_building_mask(input)
+            input[:] = [navigation_line_string for navigation_line_string, keep_line in zip(input, keep.tolist()) if keep_line]
 
     def remove_navigation_line_strings_connected_to_mv_station(self, input : List[NavigationLineString] ):
-        to_remove = []
-        for navigation_line_string in input:
-            point_a = GeometryHelperFunctions.get_connected_coords(navigation_line_string)
-            point_b = GeometryHelperFunctions.get_end_coords(navigation_line_string)
-            if len(self.extract_mv_lines_connected_to_mv_lv_station_at_point(Point(point_a))) > 0 or len(self.extract_mv_lines_connected_to_mv_lv_station_at_point(Point(point_b))):
-                to_remove.append(navigation_line_string)
-
-        for item in to_remove:
-            input.remove(item)
+        if len(input) > 0:
+            remove = self._get_navigation_line_strings_connected_to_mv_station_mask(input)
+            input[:] = [navigation_line_string for navigation_line_string, remove_line in zip(input, remove.tolist()) if not remove_line]
 
     def extract_mv_lines_connected_to_hv_mv_station(self) -> List[StationStartingLinesContainer]:
-        ret_vals = self.extract_lines_connected_to_stations_include_one_side_connected(self.geo_df_hv_stations, self.str_tree_mv_lines, 50.0)
-        for ret_val in ret_vals:
-            self.remove_navigation_line_strings_not_connected_to_building(ret_val.starting_lines)
-            self.remove_navigation_line_strings_connected_to_mv_station(ret_val.starting_lines)
+        geo_df_stations, building_years = self.get_starting_hv_stations()
+        ret_vals = self.extract_lines_connected_to_stations_include_one_side_connected(geo_df_stations, self.str_tree_mv_lines, 50.0, building_years)
+        # All starting lines of all HV stations are filtered in one pass and then redistributed over their stations
+        starting_lines = [navigation_line_string for ret_val in ret_vals for navigation_line_string in ret_val.starting_lines]
+        if len(starting_lines) > 0:
+            keep = self._get_navigation_line_strings_connected_to_building_mask(starting_lines)
+            keep[keep] = ~self._get_navigation_line_strings_connected_to_mv_station_mask([navigation_line_string for navigation_line_string, keep_line in zip(starting_lines, keep.tolist()) if keep_line])
+            keep_iter = iter(keep.tolist())
+            for ret_val in ret_vals:
+                ret_val.starting_lines = [navigation_line_string for navigation_line_string in ret_val.starting_lines if next(keep_iter)]
         return ret_vals
 
-    def define_cable_type_based_on_year(self, building_year):
+    def define_cable_type_based_on_year(self, building_year, generator_cable_case : GeneratorCableCase = None):
+        # Without a cable case the cable case of the parser is used
+        if generator_cable_case is None:
+            generator_cable_case = self.generator_cable_case
         building_year_category = self.builidng_year_to_building_year_category(building_year)
         cable_mapping = {
             (GeneratorCableCase.THIN,  BuildingYearCategory.OLD) : "GPLK-Cu-35",
@@ -168,6 +198,6 @@ class AllianderGeoDataNetworkParser(GeoDataNetworkParser):
             (GeneratorCableCase.AVG,   BuildingYearCategory.NEW) : "XLPE-Al-150",
             (GeneratorCableCase.THICK, BuildingYearCategory.NEW) : "XLPE-Al-240",
         }
-        return cable_mapping[(self.generator_cable_case, building_year_category)]
+        return cable_mapping[(generator_cable_case, building_year_category)]
 
 
@@ -0,0 +1,102 @@
+from enum import IntFlag
+from typing import Tuple
+from shapely import STRtree
+import shapely
+import geopandas
+import numpy as np
+import pandas
+
+UNKNOWN_BUILDING_YEAR = 1
+
+class BagUsagePurpose(IntFlag):
+    NONE = 0
+    RESIDENTIAL = 1
+    GATHERING = 2
+    DETENTION = 4
+    HEALTHCARE = 8
+    INDUSTRY = 16
+    OFFICE = 32
+    LODGING = 64
+    EDUCATION = 128
+    SPORT = 256
+    RETAIL = 512
+    OTHER = 1024
+
+BAG_USAGE_PURPOSE_NAMES = {
+    "woonfunctie" : BagUsagePurpose.RESIDENTIAL,
+    "bijeenkomstfunctie" : BagUsagePurpose.GATHERING,
+    "celfunctie" : BagUsagePurpose.DETENTION,
+    "gezondheidszorgfunctie" : BagUsagePurpose.HEALTHCARE,
+    "industriefunctie" : BagUsagePurpose.INDUSTRY,
+    "kantoorfunctie" : BagUsagePurpose.OFFICE,
+    "logiesfunctie" : BagUsagePurpose.LODGING,
+    "onderwijsfunctie" : BagUsagePurpose.EDUCATION,
+    "sportfunctie" : BagUsagePurpose.SPORT,
+    "winkelfunctie" : BagUsagePurpose.RETAIL,
+    "overige gebruiksfunctie" : BagUsagePurpose.OTHER,
+}
+
+# The only BAG columns used by the parsers, every other column of the pand layer is skipped when reading
+BAG_COLUMNS = ["bouwjaar", "gebruiksdoel"]
+
+# BAG buildings stored as typed arrays: the geometries with an STRtree over them, the building year as int16
+# and the usage purposes of a building encoded as BagUsagePurpose bit flags.
+class BagBuildingData:
+    def __init__(self, geometries : np.ndarray, building_years : np.ndarray, usage_purposes : np.ndarray):
+        if not (len(geometries) == len(building_years) == len(usage_purposes)):
+            raise ValueError(f"Bag building data columns differ in length ({len(geometries)}, {len(building_years)}, {len(usage_purposes)})")
+        self.geometries = geometries
+        self.building_years = building_years
+        self.usage_purposes = usage_purposes
+        self.str_tree = STRtree(geometries)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @staticmethod
+    def encode_building_years(building_years) -> np.ndarray:
+        ret_val = np.full(len(building_years), UNKNOWN_BUILDING_YEAR, dtype=np.int16)
+        building_years = np.asarray(building_years, dtype=float)
+        known = ~np.isnan(building_years)
+        ret_val[known] = building_years[known].astype(np.int16)
+        return ret_val
+
+    @staticmethod
+    def encode_usage_purposes(usage_purposes) -> np.ndarray:
+        # A building can have multiple usage purposes, e.g. "woonfunctie,industriefunctie"
+        usage_purposes = pandas.Series(usage_purposes, dtype="string")
+        ret_val = np.zeros(len(usage_purposes), dtype=np.uint16)
+        for name, flag in BAG_USAGE_PURPOSE_NAMES.items():
+            ret_val[usage_purposes.str.contains(name, regex=False, na=False).to_numpy(dtype=bool)] |= np.uint16(flag)
+        return ret_val
+
+    @staticmethod
+    def from_geo_data_frame(geo_df_bag_data : geopandas.GeoDataFrame) -> "BagBuildingData":
+        if geo_df_bag_data.empty:
+            return BagBuildingData(np.empty(0, dtype=object), np.empty(0, dtype=np.int16), np.empty(0, dtype=np.uint16))
+        building_years = BagBuildingData.encode_building_years(geo_df_bag_data["bouwjaar"]) if "bouwjaar" in geo_df_bag_data.columns else np.full(len(geo_df_bag_data), UNKNOWN_BUILDING_YEAR, dtype=np.int16)
+        usage_purposes = BagBuildingData.encode_usage_purposes(geo_df_bag_data["gebruiksdoel"]) if "gebruiksdoel" in geo_df_bag_data.columns else np.zeros(len(geo_df_bag_data), dtype=np.uint16)
+        return BagBuildingData(geo_df_bag_data.geometry.to_numpy(), building_years, usage_purposes)
+
+    @staticmethod
+    def read_file(path : str, layer : str = "pand", bbox : Tuple[float, float, float, float] = None) -> "BagBuildingData":
+        return BagBuildingData.from_geo_data_frame(geopandas.read_file(path, layer=layer, bbox=bbox, columns=BAG_COLUMNS))
+
+    def get_usage_purpose_mask(self, usage_purpose : BagUsagePurpose) -> np.ndarray:
+        return (self.usage_purposes & np.uint16(usage_purpose)) != 0
+
+    def get_geometries(self, building_indices : np.ndarray) -> np.ndarray:
+        return self.geometries[building_indices]
+
+    def get_building_indices_in_bounds(self, bounds : Tuple[float, float, float, float]) -> np.ndarray:
+        return self.str_tree.query(shapely.box(*bounds))
+
+    def get_building_indices_at_geometries(self, geometries) -> Tuple[np.ndarray, np.ndarray]:
+        return self.str_tree.query(np.asarray(geometries))
+
+    def get_building_indices_within_distance(self, geometry, distance : float) -> np.ndarray:
+        return self.str_tree.query(geometry, predicate="dwithin", distance=distance)
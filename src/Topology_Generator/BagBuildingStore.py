@@ -0,0 +1,149 @@
+from typing import Tuple
+import os
+
+import numpy as np
+import shapely
+
+from Topology_Generator.BagBuildingData import BagBuildingData, BagUsagePurpose
+from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
+
+DEFAULT_CELL_SIZE = 100.0
+ARRAY_NAMES = ("bboxes", "centroids", "building_years", "usage_purposes", "wkb", "wkb_offsets", "grid_origin", "grid_shape", "cell_offsets", "cell_building_indices")
+
+# On-disk BAG building store that is memory mapped, so worker processes share one page cached copy of the data.
+# Besides the building years, usage purpose flags, centroids and bounding boxes of all buildings it holds a static grid:
+# every cell lists the buildings whose bounding box overlaps it, as CSR-style offsets into one index array.
+# Geometries are kept as well known binary and are only decoded for the buildings a query actually needs.
+# The query interface is the same as the one of BagBuildingData, so the parsers can use either.
+class BagBuildingStore:
+    def __init__(self, directory : str):
+        if not os.path.isdir(directory):
+            raise ValueError(f"No bag building store found at {directory}")
+        self.directory = directory
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False))
+        self.cell_size = float(np.load(os.path.join(directory, "cell_size.npy")))
+
+    @staticmethod
+    def _expand_ranges(starts : np.ndarray, counts : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Every range i is expanded to the values starts[i] up to starts[i] + counts[i], returned next to the index of their range
+        range_indices = np.repeat(np.arange(len(counts)), counts)
+        values = np.arange(len(range_indices)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        return range_indices, values
+
+    @staticmethod
+    def _get_overlapped_cells(first_cells : np.ndarray, last_cells : np.ndarray, grid_width : int) -> Tuple[np.ndarray, np.ndarray]:
+        # The ids of all cells a box overlaps, from the first up to the last cell of the box, next to the index of their box
+        cells_x = last_cells[:, 0] - first_cells[:, 0] + 1
+        cells_per_box = cells_x * (last_cells[:, 1] - first_cells[:, 1] + 1)
+        box_indices, local_cell_indices = BagBuildingStore._expand_ranges(np.zeros(len(cells_per_box), dtype=np.int64), cells_per_box)
+        cell_x = first_cells[box_indices, 0] + local_cell_indices % cells_x[box_indices]
+        cell_y = first_cells[box_indices, 1] + local_cell_indices // cells_x[box_indices]
+        return box_indices, cell_y * grid_width + cell_x
+
+    @staticmethod
+    def write(directory : str, bag_building_data : BagBuildingData, cell_size : float = DEFAULT_CELL_SIZE) -> "BagBuildingStore":
+        if cell_size <= 0:
+            raise ValueError(f"Cell size should be positive, got {cell_size}")
+        os.makedirs(directory, exist_ok=True)
+        geometries = bag_building_data.geometries
+        bboxes = shapely.bounds(geometries) if len(geometries) > 0 else np.empty((0, 4))
+        # Empty geometries get NaN bounds and centroids, they are kept in the store but are not registered in any cell of the grid
+        centroids = np.full((len(geometries), 2), np.nan)
+        if len(geometries) > 0:
+            centroid_coords, centroid_indices = shapely.get_coordinates(shapely.centroid(geometries), return_index=True)
+            centroids[centroid_indices] = centroid_coords
+        wkb, wkb_offsets = GeometryHelperFunctions.geometries_to_wkb_arrays(geometries)
+
+        gridded_building_indices = np.flatnonzero(~np.isnan(bboxes).any(axis=1))
+        gridded_bboxes = bboxes[gridded_building_indices]
+        grid_origin = gridded_bboxes[:, :2].min(axis=0) if len(gridded_bboxes) > 0 else np.zeros(2)
+        grid_end = gridded_bboxes[:, 2:].max(axis=0) if len(gridded_bboxes) > 0 else np.zeros(2)
+        grid_shape = (np.floor((grid_end - grid_origin) / cell_size).astype(np.int64) + 1)
+        first_cells = np.floor((gridded_bboxes[:, :2] - grid_origin) / cell_size).astype(np.int64)
+        last_cells = np.floor((gridded_bboxes[:, 2:] - grid_origin) / cell_size).astype(np.int64)
+        # Every building is registered in all cells its bounding box overlaps
+        box_indices, cell_ids = BagBuildingStore._get_overlapped_cells(first_cells, last_cells, grid_shape[0])
+        building_indices = gridded_building_indices[box_indices]
+        order = np.lexsort((building_indices, cell_ids))
+        cell_offsets = np.zeros(grid_shape[0] * grid_shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=grid_shape[0] * grid_shape[1]), out=cell_offsets[1:])
+
+        arrays = {
+            "bboxes" : bboxes,
+            "centroids" : centroids,
+            "building_years" : np.asarray(bag_building_data.building_years, dtype=np.int16),
+            "usage_purposes" : np.asarray(bag_building_data.usage_purposes, dtype=np.uint16),
+            "wkb" : wkb,
+            "wkb_offsets" : wkb_offsets,
+            "grid_origin" : grid_origin,
+            "grid_shape" : grid_shape,
+            "cell_offsets" : cell_offsets,
+            "cell_building_indices" : building_indices[order],
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+        np.save(os.path.join(directory, "cell_size.npy"), np.float64(cell_size), allow_pickle=False)
+        return BagBuildingStore(directory)
+
+    def __len__(self) -> int:
+        return len(self.building_years)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    def get_usage_purpose_mask(self, usage_purpose : BagUsagePurpose) -> np.ndarray:
+        return (self.usage_purposes & np.uint16(usage_purpose)) != 0
+
+    def get_geometries(self, building_indices : np.ndarray) -> np.ndarray:
+        building_indices = np.asarray(building_indices, dtype=np.int64)
+        if len(building_indices) == 0:
+            return np.empty(0, dtype=object)
+        # The well known binary of the requested buildings is gathered into one buffer that is decoded in one go
+        starts = self.wkb_offsets[building_indices]
+        lengths = self.wkb_offsets[building_indices + 1] - starts
+        _, byte_indices = self._expand_ranges(starts, lengths)
+        offsets = np.zeros(len(building_indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return GeometryHelperFunctions.wkb_arrays_to_geometries(self.wkb[byte_indices], offsets)
+
+    def _query_bounds(self, bounds : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Pairs of the index of the bounds and a building whose bounding box intersects them, sorted on both indices
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        if self.empty or len(bounds) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        grid_origin = np.asarray(self.grid_origin)
+        grid_shape = np.asarray(self.grid_shape)
+        # The bounds of empty geometries are NaN, like bounds outside the grid they do not overlap any cell
+        with np.errstate(invalid="ignore"):
+            first_cells = np.maximum(np.floor((bounds[:, :2] - grid_origin) / self.cell_size), 0)
+            last_cells = np.minimum(np.floor((bounds[:, 2:] - grid_origin) / self.cell_size), grid_shape - 1)
+            query_indices = np.flatnonzero(np.all(first_cells <= last_cells, axis=1))
+        box_indices, cell_ids = self._get_overlapped_cells(first_cells[query_indices].astype(np.int64), last_cells[query_indices].astype(np.int64), int(grid_shape[0]))
+        starts = self.cell_offsets[cell_ids]
+        cell_indices, positions = self._expand_ranges(starts, self.cell_offsets[cell_ids + 1] - starts)
+        # A building overlapping several cells of the same bounds is found once per cell, only the unique pairs are kept
+        pair_ids = np.unique(query_indices[box_indices[cell_indices]] * len(self) + self.cell_building_indices[positions])
+        bounds_indices, building_indices = pair_ids // len(self), pair_ids % len(self)
+        pair_bounds = bounds[bounds_indices]
+        bboxes = self.bboxes[building_indices]
+        overlaps = (bboxes[:, 0] <= pair_bounds[:, 2]) & (bboxes[:, 2] >= pair_bounds[:, 0]) & (bboxes[:, 1] <= pair_bounds[:, 3]) & (bboxes[:, 3] >= pair_bounds[:, 1])
+        return bounds_indices[overlaps], building_indices[overlaps]
+
+    def get_building_indices_in_bounds(self, bounds : Tuple[float, float, float, float]) -> np.ndarray:
+        return self._query_bounds(np.array([bounds], dtype=float))[1]
+
+    def get_building_indices_at_geometries(self, geometries) -> Tuple[np.ndarray, np.ndarray]:
+        # Like a STRtree query without predicate a building matches a geometry when their bounding boxes intersect
+        geometries = np.asarray(geometries, dtype=object)
+        if len(geometries) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self._query_bounds(shapely.bounds(geometries))
+
+    def get_building_indices_within_distance(self, geometry, distance : float) -> np.ndarray:
+        x_min, y_min, x_max, y_max = shapely.bounds(geometry).tolist()
+        candidates = self.get_building_indices_in_bounds((x_min - distance, y_min - distance, x_max + distance, y_max + distance))
+        if len(candidates) == 0:
+            return candidates
+        return candidates[shapely.dwithin(self.get_geometries(candidates), geometry, distance)]
@@ -1,7 +1,7 @@
 from typing import List
 from Topology_Generator.GeoDataNetworkParser import GeoDataNetworkParser
 from Topology_Generator.GeometryHelperFunctions import OVERLAP_SQUARE_SIZE, GeometryHelperFunctions
-from shapely import Point, dwithin
+from shapely import Point
 
 from Topology_Generator.NetworkParser import StationStartingLinesContainer
 from Topology_Generator.dataclasses import NavigationLineString
@@ -21,7 +21,8 @@ class EnexisGeoDataNetworkParser(GeoDataNetworkParser):
 
     def extract_lv_lines_connected_to_mv_lv_station(self) -> List[StationStartingLinesContainer]:
         ret_val = []
-        for station in self.geo_df_lv_mv_station.geometry:
+        geo_df_stations, building_years = self.get_starting_lv_mv_stations()
+        for station, building_year in zip(geo_df_stations.geometry, building_years):
             lines_intersecting_with_station = []
             station_polygon = GeometryHelperFunctions.points_to_polygon(station.coords)
             lv_lines_indices = self.str_tree_lv_lines.query(station_polygon, 'dwithin', OVERLAP_SQUARE_SIZE)
@@ -29,13 +30,16 @@ class EnexisGeoDataNetworkParser(GeoDataNetworkParser):
                 lv_line = self.str_tree_lv_lines.geometries.take(index)
                 point_touches_mv_station = GeometryHelperFunctions.polygon_touches_point(Point(lv_line.coords[0]), station_polygon) 
                 lines_intersecting_with_station.append(NavigationLineString(lv_line, not point_touches_mv_station, index))
-            building_year = self.get_building_year_of_building_at_point(station)
-            ret_val.append(StationStartingLinesContainer(lines_intersecting_with_station, building_year))
+            ret_val.append(StationStartingLinesContainer(lines_intersecting_with_station, int(building_year)))
         return ret_val
     
     def extract_lv_lines_connected_to_mv_lv_station_at_point(self, point : Point) -> List[NavigationLineString]:
-        for station in self.geo_df_lv_mv_station.geometry:
-            touch_margin = 0.1
-            if dwithin(station, point, touch_margin):
-                return self.extract_lines_connected_to_2d_entity(self.str_tree_lv_lines, touch_margin, station)
-        return []
\ No newline at end of file
+        touch_margin = 0.1
+        station_index = self.get_lv_mv_station_index_at_point(point, touch_margin)
+        if station_index == -1:
+            return []
+        key = ("lv", station_index)
+        if key not in self.lv_mv_station_lines_cache:
+            station = self.geo_df_lv_mv_station.geometry.iloc[station_index]
+            self.lv_mv_station_lines_cache[key] = self.extract_lines_connected_to_2d_entity(self.str_tree_lv_lines, touch_margin, station)
+        return list(self.lv_mv_station_lines_cache[key])
\ No newline at end of file
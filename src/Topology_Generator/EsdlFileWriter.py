@@ -0,0 +1,130 @@
+from datetime import datetime
+from typing import IO, Iterable, List, Tuple
+from xml.sax.saxutils import escape
+import gzip
+import os
+
+import esdl
+from esdl.esdl_handler import EnergySystemHandler
+
+ESDL_HEADER = "<?xml version='1.0' encoding='UTF-8'?>\n"
+ESDL_NAMESPACES = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:esdl="http://www.tno.nl/esdl"'
+
+# Writes generated networks to ESDL files without going through the generic serializer of pyecore.
+# Only the assets the network builders generate are supported: electricity cables, joints and transformers with their
+# ports and point or line geometries. Any other feature that is set on a written object raises a ValueError, so nothing
+# the pyecore serializer would write is lost without notice. Every asset is written to the file as soon as it is formatted,
+# so a network is never held in memory as one string. Compressed files are gzipped ESDL, read_energy_system reads both kinds of files.
+class EsdlFileWriter:
+    def __init__(self, compress : bool = False):
+        self.compress = compress
+
+    @staticmethod
+    def _format_attribute(name : str, value) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat(timespec="microseconds")
+        return f' {name}="{escape(str(value), {chr(34) : "&quot;"})}"'
+
+    @staticmethod
+    def _is_set(esdl_obj, feature) -> bool:
+        # Like the pyecore serializer, derived, transient and container features are never written and neither are
+        # features without a value or attributes with their default value
+        if feature.derived or feature.transient or not esdl_obj.eIsSet(feature):
+            return False
+        if feature.is_reference and feature.eOpposite is not None and feature.eOpposite.containment:
+            return False
+        value = esdl_obj.eGet(feature)
+        if value is None or (feature.many and len(value) == 0):
+            return False
+        return feature.is_reference or feature.many or value != feature.get_default_value()
+
+    def _format_attributes(self, esdl_obj, attribute_names : List[str], written_feature_names : Tuple[str, ...] = ()) -> str:
+        # Only the features in _isset can be set, the pyecore serializer does not look at any other feature either.
+        # A set feature that is neither one of the attributes nor written by the caller raises, so it is not lost without notice.
+        set_feature_names = set()
+        for feature in esdl_obj._isset:
+            if self._is_set(esdl_obj, feature):
+                if feature.name not in attribute_names and feature.name not in written_feature_names:
+                    raise ValueError(f"Feature {feature.name} of {type(esdl_obj).__name__} {getattr(esdl_obj, 'id', None)} can not be written")
+                set_feature_names.add(feature.name)
+        return "".join(self._format_attribute(name, getattr(esdl_obj, name)) for name in attribute_names if name in set_feature_names)
+
+    def _write_point(self, file : IO, point : esdl.Point, tag : str, indent : str):
+        file.write(f'{indent}<{tag} xsi:type="esdl:Point"{self._format_attributes(point, ["lon", "CRS", "lat"])}/>\n')
+
+    def _write_geometry(self, file : IO, geometry, indent : str):
+        if isinstance(geometry, esdl.Point):
+            self._write_point(file, geometry, "geometry", indent)
+        elif isinstance(geometry, esdl.Line):
+            file.write(f'{indent}<geometry xsi:type="esdl:Line"{self._format_attributes(geometry, [], ("point",))}>\n')
+            for point in geometry.point:
+                self._write_point(file, point, "point", indent + "  ")
+            file.write(f"{indent}</geometry>\n")
+        elif geometry is not None:
+            raise ValueError(f"Geometry of type {type(geometry).__name__} can not be written")
+
+    def _write_port(self, file : IO, port : esdl.Port, indent : str):
+        connected_to = ""
+        if len(port.connectedTo) > 0:
+            connected_to = self._format_attribute("connectedTo", " ".join(connected_port.id for connected_port in port.connectedTo))
+        file.write(f'{indent}<port xsi:type="esdl:{type(port).__name__}"{connected_to}{self._format_attributes(port, ["id", "name"], ("connectedTo",))}/>\n')
+
+    def _write_asset(self, file : IO, asset : esdl.Asset, indent : str):
+        if isinstance(asset, esdl.ElectricityCable):
+            attribute_names = ["assetType", "length", "name", "commissioningDate", "id"]
+        elif isinstance(asset, esdl.Transformer):
+            attribute_names = ["voltagePrimary", "voltageSecundary", "assetType", "commissioningDate", "name", "id"]
+        elif isinstance(asset, esdl.Joint):
+            attribute_names = ["commissioningDate", "name", "id"]
+        else:
+            raise ValueError(f"Asset {asset.name} of type {type(asset).__name__} can not be written")
+        file.write(f'{indent}<asset xsi:type="esdl:{type(asset).__name__}"{self._format_attributes(asset, attribute_names, ("port", "geometry"))}>\n')
+        for port in asset.port:
+            self._write_port(file, port, indent + "  ")
+        self._write_geometry(file, asset.geometry, indent + "  ")
+        file.write(f"{indent}</asset>\n")
+
+    def _write(self, file : IO, energy_system : esdl.EnergySystem):
+        attributes = self._format_attributes(energy_system, ["description", "name", "id"], ("energySystemInformation", "instance"))
+        file.write(ESDL_HEADER)
+        file.write(f"<esdl:EnergySystem {ESDL_NAMESPACES}{attributes}>\n")
+        if energy_system.energySystemInformation is not None:
+            file.write(f'  <energySystemInformation xsi:type="esdl:EnergySystemInformation"{self._format_attributes(energy_system.energySystemInformation, ["id"])}/>\n')
+        for instance in energy_system.instance:
+            file.write(f'  <instance xsi:type="esdl:Instance"{self._format_attributes(instance, ["id", "name"], ("area",))}>\n')
+            area = instance.area
+            if area is not None:
+                file.write(f'    <area xsi:type="esdl:Area"{self._format_attributes(area, ["id", "name"], ("asset",))}>\n')
+                for asset in area.asset:
+                    self._write_asset(file, asset, "      ")
+                file.write("    </area>\n")
+            file.write("  </instance>\n")
+        file.write("</esdl:EnergySystem>\n")
+
+    def get_file_name(self, energy_system : esdl.EnergySystem) -> str:
+        return f"{energy_system.name}.esdl.gz" if self.compress else f"{energy_system.name}.esdl"
+
+    def write_energy_system(self, energy_system : esdl.EnergySystem, path : str):
+        if self.compress:
+            with gzip.open(path, "wt", encoding="utf-8") as file:
+                self._write(file, energy_system)
+        else:
+            with open(path, "w", encoding="utf-8") as file:
+                self._write(file, energy_system)
+
+    def write_energy_systems(self, energy_systems : Iterable[esdl.EnergySystem], directory : str) -> List[str]:
+        # Energy systems are written one at a time as they are produced, e.g. straight from MvNetworkBuilder.iter_mv_networks
+        os.makedirs(directory, exist_ok=True)
+        ret_val = []
+        for energy_system in energy_systems:
+            path = os.path.join(directory, self.get_file_name(energy_system))
+            self.write_energy_system(energy_system, path)
+            ret_val.append(path)
+        return ret_val
+
+    @staticmethod
+    def read_energy_system(path : str) -> esdl.EnergySystem:
+        if path.endswith(".gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                return EnergySystemHandler().load_from_string(file.read())
+        return EnergySystemHandler().load_file(path)
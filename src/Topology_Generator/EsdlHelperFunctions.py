@@ -1,5 +1,6 @@
 import uuid
 from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler, StringURI
 from typing import List
 
 class EsdlHelperFunctions:
@@ -32,4 +33,15 @@ class EsdlHelperFunctions:
         joint.geometry = esdl.Point(lat=lat, lon=long, CRS="WGS84")
         joint.port.append(esdl.InPort(id=str(uuid.uuid4()), name="In"))
         joint.port.append(esdl.OutPort(id=str(uuid.uuid4()), name="Out"))
-        return joint
\ No newline at end of file
+        return joint
+
+    @staticmethod
+    def energy_system_to_string(energy_system : esdl.EnergySystem) -> str:
+        # The energy system is saved through the resource it was created in, e.g. to send it to another process
+        uri = StringURI("to_string.esdl")
+        energy_system.eResource.save(uri)
+        return uri.getvalue()
+
+    @staticmethod
+    def energy_system_from_string(esdl_string : str) -> esdl.EnergySystem:
+        return EnergySystemHandler().load_from_string(esdl_string)
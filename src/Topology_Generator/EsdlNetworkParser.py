@@ -2,11 +2,11 @@ from dataclasses import dataclass
 from typing import List
 from esdl import esdl
 from esdl.esdl_handler import EnergySystemHandler
-from shapely import LineString, Point, dwithin
+from shapely import LineString, Point, STRtree
 
 from Topology_Generator.EsdlHelperFunctions import EsdlHelperFunctions
 from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
-from Topology_Generator.NetworkParser import NetworkParser, StationStartingLinesContainer
+from Topology_Generator.NetworkParser import STATION_INDEX_CACHE_SIZE, NetworkParser, StationStartingLinesContainer
 from Topology_Generator.dataclasses import NavigationLineString
 
 @dataclass
@@ -29,6 +29,7 @@ class EsdlNetworkParser(NetworkParser):
         self.cables : List[esdl.ElectricityCable] = []
         self.transformers : List[esdl.Transformer] = []
         self.transformer_touch_margin = 0.00000001
+        self.transformer_index_cache : dict[tuple[float, float], int] = {}
         super().__init__()
         self._init_transformer_mapping()
 
@@ -55,12 +56,27 @@ class EsdlNetworkParser(NetworkParser):
     def get_line_length_from_metadata(self, line_string : LineString) -> float:
         return self.line_string_meta_data[line_string].cable.length
     
-    def get_amount_of_connections_bordering_line(self, line_string : LineString) -> int:
-        return self.line_string_meta_data[line_string].amount_of_connections
+    def get_amount_of_connections_bordering_line(self, line_index : int) -> int:
+        return self.line_string_meta_data[self.lv_line_store.get_line_string(line_index)].amount_of_connections
     
     def get_transformer_connected_to_line_string(self, navigation_line_string : NavigationLineString) -> esdl.Transformer:
         coords = navigation_line_string.line_string.coords[-1] if navigation_line_string.first_point_end else navigation_line_string.line_string.coords[0]
-        return next(transformer for transformer in self.transformers if dwithin(Point(transformer.geometry.lat, transformer.geometry.lon), Point(coords), self.transformer_touch_margin))
+        transformer_index = self._get_transformer_index_at_point(Point(coords))
+        if transformer_index == -1:
+            raise ValueError(f"No transformer connected to line string at {coords}")
+        return self.transformers[transformer_index]
+
+    def _get_transformer_index_at_point(self, point : Point) -> int:
+        key = (point.x, point.y)
+        transformer_index = self.transformer_index_cache.get(key)
+        if transformer_index is None:
+            indices = self.str_tree_transformers.query(point, 'dwithin', self.transformer_touch_margin)
+            # The first transformer in the list wins, like a linear scan over the transformers would
+            transformer_index = int(indices.min()) if len(indices) > 0 else -1
+            if len(self.transformer_index_cache) >= STATION_INDEX_CACHE_SIZE:
+                self.transformer_index_cache.clear()
+            self.transformer_index_cache[key] = transformer_index
+        return transformer_index
     
     def get_esdl_connected_assets_from_line_string(self, line_strings : List[LineString]) -> List[esdl.ConnectableAsset]:
         ret_val = []
@@ -107,6 +123,7 @@ class EsdlNetworkParser(NetworkParser):
         return [value for value in self.lines_connected_to_transformer_mapping.values()]
 
     def _init_transformer_mapping(self) -> List[StationStartingLinesContainer]:
+        self.str_tree_transformers = STRtree([Point(transformer.geometry.lat, transformer.geometry.lon) for transformer in self.transformers])
         for transformer in self.transformers:
             transformer_location = Point(transformer.geometry.lat, transformer.geometry.lon)
             lv_lines_indices = self.str_tree_lv_lines.query(transformer_location, 'touches')
@@ -118,11 +135,10 @@ class EsdlNetworkParser(NetworkParser):
             self.lines_connected_to_transformer_mapping[transformer] = StationStartingLinesContainer(lines_intersecting_with_station, 1)
     
     def extract_lv_lines_connected_to_mv_lv_station_at_point(self, point : Point) -> List[NavigationLineString]:
-        for transformer in self.transformers:
-            transformer_location = Point(transformer.geometry.lat, transformer.geometry.lon)
-            if dwithin(transformer_location, point, self.transformer_touch_margin):
-                return self.lines_connected_to_transformer_mapping[transformer].starting_lines
-        return []
+        transformer_index = self._get_transformer_index_at_point(point)
+        if transformer_index == -1:
+            return []
+        return self.lines_connected_to_transformer_mapping[self.transformers[transformer_index]].starting_lines
 
     def _extract_lv_network_lines(self) -> List[LineString]:
         esdl_obj_meta_data = self._init_generic_collections()
@@ -1,10 +1,18 @@
-from typing import List
-from shapely import LineString, MultiLineString, Point
+from typing import List, Tuple, Union
+from shapely import LineString, MultiLineString, Point, STRtree
+import copy
+import os
 import geopandas
 import numpy as np
+import shapely
 
-from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
-from Topology_Generator.NetworkParser import NetworkParser, StationStartingLinesContainer
+from Topology_Generator.BagBuildingData import BagBuildingData, BagUsagePurpose
+from Topology_Generator.BagBuildingStore import BagBuildingStore
+from Topology_Generator.GeometryHelperFunctions import CLOSE_MARGIN, GeometryHelperFunctions
+from Topology_Generator.LineIncidenceIndex import LineIncidenceIndex
+from Topology_Generator.LineStore import LineStore
+from Topology_Generator.NetworkParser import STATION_INDEX_CACHE_SIZE, NetworkParser, StationStartingLinesContainer
+from Topology_Generator.dataclasses import NavigationLineString
 from enum import Enum
 
 class GeneratorCableCase(Enum):
@@ -18,21 +26,159 @@ class BuildingYearCategory(Enum):
     NEW = 3
 
 class GeoDataNetworkParser(NetworkParser):
-    def __init__(self, geo_df_lv_lines : geopandas.GeoDataFrame, lv_mv_station_df : geopandas.GeoDataFrame, geo_df_bag_data : geopandas.GeoDataFrame = geopandas.GeoDataFrame(), geo_df_mv_lines : geopandas.GeoDataFrame = geopandas.GeoDataFrame(), geo_df_hv_stations : geopandas.GeoDataFrame = geopandas.GeoDataFrame(), generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG):
+    def __init__(self, geo_df_lv_lines : geopandas.GeoDataFrame, lv_mv_station_df : geopandas.GeoDataFrame, geo_df_bag_data : Union[geopandas.GeoDataFrame, BagBuildingData, BagBuildingStore] = geopandas.GeoDataFrame(), geo_df_mv_lines : geopandas.GeoDataFrame = geopandas.GeoDataFrame(), geo_df_hv_stations : geopandas.GeoDataFrame = geopandas.GeoDataFrame(), generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG):
         self.geo_df_lv_lines = geo_df_lv_lines
         self.geo_df_lv_mv_station = lv_mv_station_df
-        self.geo_df_bag_data = geo_df_bag_data
+        # Bag data given as a data frame is converted, only its geometry, bouwjaar and gebruiksdoel columns are used
+        self.bag_building_data : Union[BagBuildingData, BagBuildingStore] = geo_df_bag_data if isinstance(geo_df_bag_data, (BagBuildingData, BagBuildingStore)) else BagBuildingData.from_geo_data_frame(geo_df_bag_data)
         self.geo_df_mv_lines = geo_df_mv_lines
         self.geo_df_hv_stations = geo_df_hv_stations
-        self.counted_connections_indices = np.array([])
         self.generator_cable_case : GeneratorCableCase = generator_cable_case
+        self.bag_residential_mask = self.bag_building_data.get_usage_purpose_mask(BagUsagePurpose.RESIDENTIAL)
+        self.lv_mv_station_building_years = self._get_building_years_of_stations(self.geo_df_lv_mv_station)
+        self.hv_station_building_years = self._get_building_years_of_stations(self.geo_df_hv_stations)
+        # Networks are generated starting from these stations, a bbox view only starts from the stations in its bbox
+        self.lv_mv_starting_station_indices = np.arange(len(self.geo_df_lv_mv_station))
+        self.hv_starting_station_indices = np.arange(len(self.geo_df_hv_stations))
+        self.lv_mv_station_index_cache : dict[tuple[float, float, float], int] = {}
+        self.lv_mv_station_lines_cache : dict[tuple[str, int], List[NavigationLineString]] = {}
         super().__init__()
+        self.lv_line_amount_of_connections = self._compute_amount_of_connections_per_lv_line()
+
+    def get_parsed_state(self) -> dict:
+        # All preprocessed data of the parser as plain arrays, from_parsed_state restores a parser from it
+        state = {}
+        for prefix, line_store, line_incidence_index in [("lv", self.lv_line_store, self.lv_line_incidence_index), ("mv", self.mv_line_store, self.mv_line_incidence_index)]:
+            state[f"{prefix}_line_coords"], state[f"{prefix}_line_offsets"] = line_store.get_coordinate_arrays()
+            for name, array in line_incidence_index.get_arrays().items():
+                state[f"{prefix}_incidence_{name}"] = array
+        for prefix, geo_df in [("lv_mv_station", self.geo_df_lv_mv_station), ("hv_station", self.geo_df_hv_stations)]:
+            state.update(self._get_station_table_state(prefix, geo_df))
+        if isinstance(self.bag_building_data, BagBuildingStore):
+            # A building store is already on disk, only a reference to it is kept
+            state["bag_store_directory"] = np.array(os.path.abspath(self.bag_building_data.directory))
+        else:
+            state["bag_wkb"], state["bag_wkb_offsets"] = GeometryHelperFunctions.geometries_to_wkb_arrays(self.bag_building_data.geometries)
+            state["bag_building_years"] = self.bag_building_data.building_years
+            state["bag_usage_purposes"] = self.bag_building_data.usage_purposes
+        state["lv_mv_station_building_years"] = self.lv_mv_station_building_years
+        state["hv_station_building_years"] = self.hv_station_building_years
+        state["lv_line_amount_of_connections"] = self.lv_line_amount_of_connections
+        return state
+
+    @classmethod
+    def from_parsed_state(cls, state : dict, generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG) -> "GeoDataNetworkParser":
+        # Builds a parser from the result of get_parsed_state, none of the geometry preprocessing of __init__ is repeated
+        parser = cls.__new__(cls)
+        parser.generator_cable_case = generator_cable_case
+        parser.geo_df_lv_mv_station = cls._station_table_from_state("lv_mv_station", state)
+        parser.geo_df_hv_stations = cls._station_table_from_state("hv_station", state)
+        if "bag_store_directory" in state:
+            parser.bag_building_data = BagBuildingStore(str(np.asarray(state["bag_store_directory"])))
+        else:
+            parser.bag_building_data = BagBuildingData(GeometryHelperFunctions.wkb_arrays_to_geometries(state["bag_wkb"], state["bag_wkb_offsets"]), state["bag_building_years"], state["bag_usage_purposes"])
+        parser.bag_residential_mask = parser.bag_building_data.get_usage_purpose_mask(BagUsagePurpose.RESIDENTIAL)
+        parser.lv_mv_station_building_years = state["lv_mv_station_building_years"]
+        parser.hv_station_building_years = state["hv_station_building_years"]
+        parser.lv_mv_starting_station_indices = np.arange(len(parser.geo_df_lv_mv_station))
+        parser.hv_starting_station_indices = np.arange(len(parser.geo_df_hv_stations))
+        parser.lv_mv_station_index_cache = {}
+        parser.lv_mv_station_lines_cache = {}
+        parser.lv_line_store = LineStore.from_coordinate_arrays(state["lv_line_coords"], state["lv_line_offsets"])
+        parser.str_tree_lv_lines = STRtree(parser.lv_line_store.geometries)
+        parser.lv_line_incidence_index = LineIncidenceIndex.from_arrays(parser.lv_line_store, {name : state[f"lv_incidence_{name}"] for name in LineIncidenceIndex.ARRAY_NAMES})
+        parser.mv_line_store = LineStore.from_coordinate_arrays(state["mv_line_coords"], state["mv_line_offsets"])
+        parser.str_tree_mv_lines = STRtree(parser.mv_line_store.geometries)
+        parser.mv_line_incidence_index = LineIncidenceIndex.from_arrays(parser.mv_line_store, {name : state[f"mv_incidence_{name}"] for name in LineIncidenceIndex.ARRAY_NAMES})
+        parser.geo_df_lv_lines = geopandas.GeoDataFrame(geometry=parser.lv_line_store.geometries)
+        parser.geo_df_mv_lines = geopandas.GeoDataFrame(geometry=parser.mv_line_store.geometries)
+        parser.lv_line_amount_of_connections = state["lv_line_amount_of_connections"]
+        return parser
+
+    @staticmethod
+    def _get_station_table_state(prefix : str, geo_df : geopandas.GeoDataFrame) -> dict:
+        # Geometries as well known binary and every attribute column as its own array, so nothing has to be pickled.
+        # Numeric, boolean and datetime columns keep their type, other columns are stored as strings with a mask of missing values.
+        state = {}
+        has_geometry = isinstance(geo_df, geopandas.GeoDataFrame) and geo_df.active_geometry_name is not None
+        geometries = geo_df.geometry.to_numpy() if has_geometry and not geo_df.empty else []
+        state[f"{prefix}_wkb"], state[f"{prefix}_wkb_offsets"] = GeometryHelperFunctions.geometries_to_wkb_arrays(geometries)
+        state[f"{prefix}_crs"] = np.array(geo_df.crs.to_wkt() if has_geometry and geo_df.crs is not None else "")
+        columns = [column for column in geo_df.columns if not has_geometry or column != geo_df.active_geometry_name]
+        state[f"{prefix}_columns"] = np.array([str(column) for column in columns], dtype=str)
+        for column_index, column in enumerate(columns):
+            values = geo_df[column].to_numpy()
+            if values.dtype.kind in "biufcmM":
+                state[f"{prefix}_column_{column_index}"] = values
+            else:
+                state[f"{prefix}_column_{column_index}"] = np.array([str(value) for value in values], dtype=str)
+                state[f"{prefix}_column_{column_index}_missing"] = geo_df[column].isna().to_numpy()
+        return state
+
+    @staticmethod
+    def _station_table_from_state(prefix : str, state : dict) -> geopandas.GeoDataFrame:
+        columns = {}
+        for column_index, column in enumerate(np.asarray(state[f"{prefix}_columns"]).tolist()):
+            values = np.array(state[f"{prefix}_column_{column_index}"])
+            if f"{prefix}_column_{column_index}_missing" in state:
+                values = values.astype(object)
+                values[np.asarray(state[f"{prefix}_column_{column_index}_missing"])] = None
+            columns[column] = values
+        geometries = GeometryHelperFunctions.wkb_arrays_to_geometries(state[f"{prefix}_wkb"], state[f"{prefix}_wkb_offsets"])
+        crs = str(np.asarray(state[f"{prefix}_crs"]))
+        return geopandas.GeoDataFrame(columns, geometry=geometries, crs=crs if crs != "" else None)
+
+    @staticmethod
+    def _get_station_indices_in_bbox(geo_df_stations : geopandas.GeoDataFrame, bbox : Tuple[float, float, float, float]) -> np.ndarray:
+        if geo_df_stations.empty:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(geo_df_stations.sindex.query(shapely.box(*bbox), predicate="intersects"))
+
+    def create_bbox_view(self, bbox : Tuple[float, float, float, float]) -> "GeoDataNetworkParser":
+        # A view shares the lines, stations and bag buildings of this parser with all their indexes, it only
+        # restricts the stations networks are generated from to the ones in the bbox. Networks can still be followed
+        # outside the bbox. As line and station indices are those of the whole region the lookup caches are shared as well.
+        view = copy.copy(self)
+        view.lv_mv_starting_station_indices = self._get_station_indices_in_bbox(self.geo_df_lv_mv_station, bbox)
+        view.hv_starting_station_indices = self._get_station_indices_in_bbox(self.geo_df_hv_stations, bbox)
+        return view
+
+    def get_starting_lv_mv_stations(self) -> Tuple[geopandas.GeoDataFrame, np.ndarray]:
+        return self.geo_df_lv_mv_station.take(self.lv_mv_starting_station_indices), self.lv_mv_station_building_years[self.lv_mv_starting_station_indices]
+
+    def get_starting_hv_stations(self) -> Tuple[geopandas.GeoDataFrame, np.ndarray]:
+        return self.geo_df_hv_stations.take(self.hv_starting_station_indices), self.hv_station_building_years[self.hv_starting_station_indices]
+
+    def _deduplicate_lines(self, lines : List[LineString]) -> List[LineString]:
+        # Lines are hashed on a grid of quantized start and end coordinates. With a cell size of twice the margin
+        # every line within the margin of an accepted line ends up in one of the 3x3 neighbouring cells.
+        lines = [line for line in lines if not line.is_empty]
+        if len(lines) == 0:
+            return []
+        start_coords, end_coords = GeometryHelperFunctions.get_start_and_end_coords(lines)
+        cell_size = 2 * CLOSE_MARGIN
+        start_cells = np.floor(start_coords / cell_size).astype(np.int64).tolist()
+        end_cells = np.floor(end_coords / cell_size).astype(np.int64).tolist()
+        start_coords = start_coords.tolist()
+        end_coords = end_coords.tolist()
+
+        grid = {}
+        accepted_indices = []
+        for i in range(len(lines)):
+            new_start = start_coords[i]
+            new_end = end_coords[i]
+            cell_x, cell_y = start_cells[i]
+            candidates = set()
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    candidates.update(grid.get((cell_x + dx, cell_y + dy), ()))
+            line_with_similar_start_end_coords = any((GeometryHelperFunctions.points_are_close(start_coords[j], new_start) and GeometryHelperFunctions.points_are_close(end_coords[j], new_end)) or (GeometryHelperFunctions.points_are_close(start_coords[j], new_end) and GeometryHelperFunctions.points_are_close(end_coords[j], new_start)) for j in candidates)
+            if not line_with_similar_start_end_coords:
+                accepted_indices.append(i)
+                grid.setdefault(tuple(start_cells[i]), []).append(i)
+                grid.setdefault(tuple(end_cells[i]), []).append(i)
+        return [lines[i] for i in accepted_indices]
 
-    def _add_line(self, lines : List[LineString], new_line : LineString):
-        line_with_similar_start_end_coords = any((GeometryHelperFunctions.points_are_close(line.coords[0], new_line.coords[0]) and GeometryHelperFunctions.points_are_close(line.coords[-1], new_line.coords[-1])) or (GeometryHelperFunctions.points_are_close(line.coords[0], new_line.coords[-1]) and GeometryHelperFunctions.points_are_close(line.coords[-1], new_line.coords[0])) for line in lines)
-        if not line_with_similar_start_end_coords:
-            lines.append(new_line)
-            
     def extract_lv_lines_connected_to_mv_lv_station(self) -> List[StationStartingLinesContainer]:
         # Method should be overriden by derrived classes
         pass
@@ -41,35 +187,78 @@ class GeoDataNetworkParser(NetworkParser):
         # Method should be overriden by derrived classes
         pass
 
-    def get_amount_of_connections_bordering_line(self, line_string : LineString) -> int:
+    def _compute_amount_of_connections_per_lv_line(self) -> np.ndarray:
         MAX_DISTANCE_TO_LINE = 20.0
-        ret_val = 0.0
-        if not self.geo_df_bag_data.empty:
-            indices = self.geo_df_bag_data.sindex.query(line_string, predicate="dwithin", distance=MAX_DISTANCE_TO_LINE)
-            new_connections = np.setdiff1d(indices, self.counted_connections_indices)
-            new_connections = np.array([index for index in new_connections if self.geo_df_bag_data.take([index]).iloc[0]["gebruiksdoel"] != None and "woonfunctie" in self.geo_df_bag_data.take([index]).iloc[0]["gebruiksdoel"]])
-            self.counted_connections_indices = np.insert(self.counted_connections_indices, 0, new_connections)
-            ret_val = new_connections.size
+        ret_val = np.zeros(len(self.lv_line_store), dtype=np.int64)
+        if len(self.lv_line_store) > 0 and np.any(self.bag_residential_mask):
+            # Only buildings within the maximum distance of the bounds of all lines can be connected to a line
+            x_min, y_min, x_max, y_max = shapely.total_bounds(self.lv_line_store.geometries).tolist()
+            building_indices_near_lines = self.bag_building_data.get_building_indices_in_bounds((x_min - MAX_DISTANCE_TO_LINE, y_min - MAX_DISTANCE_TO_LINE, x_max + MAX_DISTANCE_TO_LINE, y_max + MAX_DISTANCE_TO_LINE))
+            residential_buildings = self.bag_building_data.get_geometries(building_indices_near_lines[self.bag_residential_mask[building_indices_near_lines]])
+            building_indices, line_indices = self.str_tree_lv_lines.query_nearest(residential_buildings, max_distance=MAX_DISTANCE_TO_LINE, all_matches=True)
+            # Every building is connected to its nearest line, on a tie the line with the lowest index is chosen
+            order = np.lexsort((line_indices, building_indices))
+            _, first_match_indices = np.unique(building_indices[order], return_index=True)
+            ret_val += np.bincount(line_indices[order][first_match_indices], minlength=len(self.lv_line_store))
         return ret_val
 
+    def get_amount_of_connections_bordering_line(self, line_index : int) -> int:
+        return int(self.lv_line_amount_of_connections[line_index])
+
     def is_there_industry_at_point(self, point : Point) -> bool:
         MAX_DISTANCE_TO_POINT = 12.0
-        indices = self.geo_df_bag_data.sindex.query(point, predicate="dwithin", distance=MAX_DISTANCE_TO_POINT)
-        return any("industriefunctie" in self.geo_df_bag_data.take(index)["gebruiksdoel"] for index in indices)
+        indices = self.bag_building_data.get_building_indices_within_distance(point, MAX_DISTANCE_TO_POINT)
+        return bool(np.any(self.bag_building_data.get_usage_purpose_mask(BagUsagePurpose.INDUSTRY)[indices]))
+
+    def get_building_years_of_buildings_at_points(self, geometries) -> np.ndarray:
+        ret_val = np.ones(len(geometries), dtype=np.int64)
+        if not self.bag_building_data.empty and len(geometries) > 0:
+            geometry_indices, building_indices = self.bag_building_data.get_building_indices_at_geometries(geometries)
+            if len(geometry_indices) > 0:
+                # The first building found for a geometry determines its building year
+                _, first_match_indices = np.unique(geometry_indices, return_index=True)
+                ret_val[geometry_indices[first_match_indices]] = self.bag_building_data.building_years[building_indices[first_match_indices]]
+        return ret_val
 
     def get_building_year_of_building_at_point(self, point : Point)  -> int:
-        if not self.geo_df_bag_data.empty:
-            indices = self.geo_df_bag_data.sindex.query(point)
-            for index in indices:
-                building = self.geo_df_bag_data.take([index])
-                return int(building.iloc[0]["bouwjaar"])
-        return 1
+        return int(self.get_building_years_of_buildings_at_points([point])[0])
+
+    def _get_building_years_of_stations(self, geo_df_stations : geopandas.GeoDataFrame) -> np.ndarray:
+        if geo_df_stations.empty:
+            return np.empty(0, dtype=np.int64)
+        return self.get_building_years_of_buildings_at_points(geo_df_stations.geometry.to_numpy())
+
+    def get_lv_mv_station_index_at_point(self, point : Point, distance : float) -> int:
+        key = (point.x, point.y, distance)
+        station_index = self.lv_mv_station_index_cache.get(key)
+        if station_index is None:
+            station_index = -1
+            if not self.geo_df_lv_mv_station.empty:
+                indices = self.geo_df_lv_mv_station.sindex.query(point, predicate="dwithin", distance=distance)
+                if len(indices) > 0:
+                    # The first station in the data frame wins, like a linear scan over the stations would
+                    station_index = int(indices.min())
+            # The cache is keyed on coordinates, so it is emptied once full instead of growing over a whole run
+            if len(self.lv_mv_station_index_cache) >= STATION_INDEX_CACHE_SIZE:
+                self.lv_mv_station_index_cache.clear()
+            self.lv_mv_station_index_cache[key] = station_index
+        return station_index
+
+    def get_lv_mv_station_indices_at_points(self, points : np.ndarray, distance : float) -> np.ndarray:
+        ret_val = np.full(len(points), -1, dtype=np.int64)
+        if not self.geo_df_lv_mv_station.empty and len(points) > 0:
+            point_indices, station_indices = self.geo_df_lv_mv_station.sindex.query(points, predicate="dwithin", distance=distance)
+            if len(point_indices) > 0:
+                # Like get_lv_mv_station_index_at_point the first station in the data frame wins
+                first_station_indices = np.full(len(points), len(self.geo_df_lv_mv_station), dtype=np.int64)
+                np.minimum.at(first_station_indices, point_indices, station_indices)
+                ret_val[point_indices] = first_station_indices[point_indices]
+        return ret_val
 
     def get_building_year_of_transformer_house_at_point(self, point : Point) -> int:
         mv_station_indices = self.geo_df_lv_mv_station.sindex.query(point, predicate="dwithin", distance=3.0)
         if len(mv_station_indices) > 0:
-            mv_station_point = self.geo_df_lv_mv_station.take([mv_station_indices[0]]).geometry
-            return self.get_building_year_of_building_at_point(Point(mv_station_point.x, mv_station_point.y))
+            return int(self.lv_mv_station_building_years[mv_station_indices[0]])
         return 1
 
     def get_line_length_from_metadata(self, line_string : LineString) -> float:
@@ -81,11 +270,10 @@ class GeoDataNetworkParser(NetworkParser):
         if not df_lines.empty:
             for line in lines.geometry:
                 if isinstance(line, LineString):
-                    self._add_line(all_lines, line)
+                    all_lines.append(line)
                 if isinstance(line, MultiLineString):
-                    for line_instance in line.geoms:
-                        self._add_line(all_lines, line_instance)
-        return all_lines
+                    all_lines.extend(line.geoms)
+        return self._deduplicate_lines(all_lines)
 
     def _extract_lv_network_lines(self) -> List[LineString]:
         return self._extract_network_lines(self.geo_df_lv_lines)
@@ -1,6 +1,7 @@
 
-from typing import List
-from shapely import Polygon, Point, intersects, LineString, STRtree, covers
+from typing import List, Tuple
+from shapely import Polygon, Point, intersects, LineString, covers
+import shapely
 
 import numpy as np
 
@@ -16,6 +17,50 @@ class GeometryHelperFunctions:
     def points_are_close(point_a, point_b, margin = CLOSE_MARGIN ): 
         return point_a[0] - margin <= point_b[0] <= point_a[0] + margin and point_a[1] - margin <= point_b[1] <= point_a[1] + margin
 
+    @staticmethod
+    def points_are_close_vectorized(points_a : np.ndarray, points_b : np.ndarray, margin = CLOSE_MARGIN) -> np.ndarray:
+        return (points_a[:, 0] - margin <= points_b[:, 0]) & (points_b[:, 0] <= points_a[:, 0] + margin) & (points_a[:, 1] - margin <= points_b[:, 1]) & (points_b[:, 1] <= points_a[:, 1] + margin)
+
+    @staticmethod
+    def get_start_and_end_coords(lines : List[LineString]) -> Tuple[np.ndarray, np.ndarray]:
+        if len(lines) == 0:
+            return np.empty((0, 2)), np.empty((0, 2))
+        coords, line_indices = shapely.get_coordinates(lines, return_index=True)
+        coords_per_line = np.bincount(line_indices, minlength=len(lines))
+        end_indices = np.cumsum(coords_per_line) - 1
+        start_indices = end_indices - coords_per_line + 1
+        return coords[start_indices], coords[end_indices]
+
+    @staticmethod
+    def lines_to_coordinate_arrays(lines : List[LineString]) -> Tuple[np.ndarray, np.ndarray]:
+        # All coordinates of all lines in one array, the coordinates of line i are coords[offsets[i]:offsets[i + 1]]
+        include_z = len(lines) > 0 and bool(np.any(shapely.has_z(lines)))
+        coords = shapely.get_coordinates(lines, include_z=include_z) if len(lines) > 0 else np.empty((0, 2))
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        if len(lines) > 0:
+            np.cumsum(shapely.get_num_coordinates(lines), out=offsets[1:])
+        return coords, offsets
+
+    @staticmethod
+    def coordinate_arrays_to_lines(coords : np.ndarray, offsets : np.ndarray) -> List[LineString]:
+        if len(offsets) <= 1:
+            return []
+        line_indices = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        return list(shapely.linestrings(np.asarray(coords), indices=line_indices))
+
+    @staticmethod
+    def geometries_to_wkb_arrays(geometries) -> Tuple[np.ndarray, np.ndarray]:
+        # The well known binary of all geometries concatenated in one byte array, so geometries of any type can be stored
+        wkbs = shapely.to_wkb(np.asarray(geometries, dtype=object)).tolist() if len(geometries) > 0 else []
+        offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+        np.cumsum([len(wkb) for wkb in wkbs], out=offsets[1:])
+        return np.frombuffer(b"".join(wkbs), dtype=np.uint8), offsets
+
+    @staticmethod
+    def wkb_arrays_to_geometries(buffer : np.ndarray, offsets : np.ndarray) -> np.ndarray:
+        data = np.asarray(buffer).tobytes()
+        return shapely.from_wkb(np.array([data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)], dtype=object))
+
     @staticmethod
     def points_to_polygon(points) -> Polygon:
         return Polygon(points)
@@ -47,20 +92,6 @@ class GeometryHelperFunctions:
             return None
         return NavigationLineString(line_2, point_first_end, index)
 
-    @staticmethod
-    def get_next_lines(str_tree_lines : STRtree, navigation_line_string : NavigationLineString) -> List[NavigationLineString]:
-        point_to_connect_to = Point(navigation_line_string.line_string.coords[0]) if navigation_line_string.first_point_end else Point(navigation_line_string.line_string.coords[-1])
-        intersecting_indices = str_tree_lines.query(point_to_connect_to, 'touches')
-        intersecting_indices = np.setdiff1d(intersecting_indices, np.array([navigation_line_string.index]))
-
-        ret_val = []
-        for index in intersecting_indices:
-            next_line = str_tree_lines.geometries.take(index)
-            next_line_string_end_pair = GeometryHelperFunctions.line_string_connected_to_point(point_to_connect_to, next_line, index)
-            if next_line_string_end_pair != None:
-                ret_val.append(next_line_string_end_pair)
-        return ret_val
-    
     @staticmethod
     def get_end_coords(navigation_line_string : NavigationLineString):
         return navigation_line_string.line_string.coords[0] if navigation_line_string.first_point_end else navigation_line_string.line_string.coords[-1]
@@ -0,0 +1,67 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from Topology_Generator.LineStore import LineStore
+from Topology_Generator.dataclasses import NavigationLineString
+
+# Maps every line endpoint to a node id and stores for every node the lines ending in it as CSR-style arrays.
+# Endpoints only share a node when their coordinates are exactly equal, which matches the 'touches' relation
+# between an endpoint and a line. Closed lines have no boundary so they are not incident to any node.
+class LineIncidenceIndex:
+    ARRAY_NAMES = ("node_coords", "start_nodes", "end_nodes", "node_line_indices", "node_line_first_point_connected", "node_offsets", "endpoint_degrees")
+
+    def __init__(self, line_store : LineStore):
+        self.line_store = line_store
+        amount_of_lines = len(line_store)
+        # Adding 0.0 turns -0.0 into 0.0 so both end up in the same node
+        endpoints = np.concatenate([line_store.start_coords, line_store.end_coords]) + 0.0
+        if len(endpoints) > 0:
+            self.node_coords, node_ids = np.unique(endpoints, axis=0, return_inverse=True)
+        else:
+            self.node_coords, node_ids = np.empty((0, 2)), np.empty(0, dtype=np.int64)
+        node_ids = node_ids.reshape(-1)
+        self.start_nodes = node_ids[:amount_of_lines]
+        self.end_nodes = node_ids[amount_of_lines:]
+
+        line_indices = np.arange(amount_of_lines)
+        open_lines = self.start_nodes != self.end_nodes
+        incident_nodes = np.concatenate([self.start_nodes[open_lines], self.end_nodes[open_lines]])
+        incident_lines = np.concatenate([line_indices[open_lines], line_indices[open_lines]])
+        incident_first_point = np.concatenate([np.ones(np.count_nonzero(open_lines), dtype=bool), np.zeros(np.count_nonzero(open_lines), dtype=bool)])
+        order = np.lexsort((incident_lines, incident_nodes))
+        self.node_line_indices = incident_lines[order]
+        self.node_line_first_point_connected = incident_first_point[order]
+        self.node_offsets = np.zeros(len(self.node_coords) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(incident_nodes, minlength=len(self.node_coords)), out=self.node_offsets[1:])
+        # Amount of lines touching the first and the last point of every line
+        node_degrees = np.diff(self.node_offsets)
+        self.endpoint_degrees = np.stack([node_degrees[self.start_nodes], node_degrees[self.end_nodes]], axis=1)
+
+    @staticmethod
+    def from_arrays(line_store : LineStore, arrays : dict) -> "LineIncidenceIndex":
+        # Restores an index from the arrays of get_arrays without recomputing it
+        ret_val = LineIncidenceIndex.__new__(LineIncidenceIndex)
+        ret_val.line_store = line_store
+        for name in LineIncidenceIndex.ARRAY_NAMES:
+            setattr(ret_val, name, arrays[name])
+        return ret_val
+
+    def get_arrays(self) -> dict:
+        return {name : getattr(self, name) for name in LineIncidenceIndex.ARRAY_NAMES}
+
+    def get_end_node(self, index : int, first_point_end : bool) -> int:
+        return self.start_nodes[index] if first_point_end else self.end_nodes[index]
+
+    def get_incident_lines(self, node : int) -> Iterator[Tuple[int, bool]]:
+        start = self.node_offsets[node]
+        end = self.node_offsets[node + 1]
+        return zip(self.node_line_indices[start:end].tolist(), self.node_line_first_point_connected[start:end].tolist())
+
+    def get_next_lines(self, navigation_line_string : NavigationLineString) -> List[NavigationLineString]:
+        node = self.get_end_node(navigation_line_string.index, navigation_line_string.first_point_end)
+        ret_val = []
+        for index, first_point_connected in self.get_incident_lines(node):
+            if index != navigation_line_string.index:
+                ret_val.append(NavigationLineString.from_line_store(self.line_store, index, not first_point_connected))
+        return ret_val
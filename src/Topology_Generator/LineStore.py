@@ -0,0 +1,60 @@
+from typing import List, Tuple
+from shapely import LineString
+import shapely
+
+import numpy as np
+
+from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
+from Topology_Generator.dataclasses import NavigationLineString
+
+# Storage of lines by index: the geometry array the STRtree of the parser is built from, next to the precomputed
+# start coordinates, end coordinates and length of every line. The STRtree needs the geometry objects for as long as
+# the parser lives, so they are the only copy of the line coordinates. The flat coordinate array with per line offsets
+# is only produced when asked for, e.g. to store the lines in the parsed network cache.
+class LineStore:
+
+    def __init__(self, geometries : np.ndarray):
+        self.geometries = geometries
+        if len(geometries) > 0:
+            self.start_coords = shapely.get_coordinates(shapely.get_point(geometries, 0))
+            self.end_coords = shapely.get_coordinates(shapely.get_point(geometries, -1))
+            self.lengths = shapely.length(geometries)
+        else:
+            self.start_coords, self.end_coords, self.lengths = np.empty((0, 2)), np.empty((0, 2)), np.empty(0)
+        self._line_strings : List[LineString] = None
+
+    @staticmethod
+    def from_lines(lines : List[LineString]) -> "LineStore":
+        geometries = np.empty(len(lines), dtype=object)
+        geometries[:] = lines
+        return LineStore(geometries)
+
+    @staticmethod
+    def from_coordinate_arrays(coords : np.ndarray, offsets : np.ndarray) -> "LineStore":
+        return LineStore.from_lines(GeometryHelperFunctions.coordinate_arrays_to_lines(coords, offsets))
+
+    def get_coordinate_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return GeometryHelperFunctions.lines_to_coordinate_arrays(self.geometries)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def get_line_strings(self) -> List[LineString]:
+        # Made once, so repeated access to the list of all lines does not copy the geometry array every time
+        if self._line_strings is None:
+            self._line_strings = self.geometries.tolist()
+        return self._line_strings
+
+    def get_line_string(self, index : int) -> LineString:
+        return self.geometries[index]
+
+    def get_end_coords(self, navigation_line_string : NavigationLineString) -> Tuple[float, float]:
+        coords = self.start_coords if navigation_line_string.first_point_end else self.end_coords
+        return tuple(coords[navigation_line_string.index].tolist())
+
+    def get_connected_coords(self, navigation_line_string : NavigationLineString) -> Tuple[float, float]:
+        coords = self.end_coords if navigation_line_string.first_point_end else self.start_coords
+        return tuple(coords[navigation_line_string.index].tolist())
+
+    def get_length(self, index : int) -> float:
+        return float(self.lengths[index])
@@ -1,39 +1,127 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Iterator, List, Union
+import networkx as nx
+import multiprocessing
 import uuid
 
 import esdl
+import numpy as np
 from shapely import STRtree, Point
+from Topology_Generator.EsdlFileWriter import EsdlFileWriter
 from Topology_Generator.EsdlHelperFunctions import EsdlHelperFunctions
 from Topology_Generator.EsdlNetworkParser import EsdlNetworkParser
-from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
+from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase
+from Topology_Generator.LineIncidenceIndex import LineIncidenceIndex
+from Topology_Generator.LineStore import LineStore
 from Topology_Generator.NetworkParser import NetworkParser, StationStartingLinesContainer
 from datetime import datetime
 from esdl.esdl_handler import EnergySystemHandler
 from Topology_Generator.Logging import LOGGER
 
 from Topology_Generator.NetworkPlotter import NetworkPlotter
-from Topology_Generator.dataclasses import NavigationLineString
+from Topology_Generator.BagBuildingData import UNKNOWN_BUILDING_YEAR
+from Topology_Generator.dataclasses import MvCableRecord, MvCableSegment, MvNodeRecord, MvNodeType, MvRing, MvRingTopology, NavigationLineString, NetworkTopologyInfo
 
 @dataclass
-class EsdlAssetWithMetaData:
-    esdl_obj : esdl.Asset
+class MvNodeWithMetaData:
+    node : MvNodeRecord
     number : int
 
+class MvTraversalEngine(Enum):
+    RECURSIVE = 1
+    ITERATIVE = 2
+
+# What is generated from an mv ring: an ESDL energy system, a NetworkTopologyInfo with a networkx graph of the ring
+# that can be used with the TopologyAnalyzer, or the MvRingTopology arrays the graph is made from
+class MvNetworkOutput(Enum):
+    ENERGY_SYSTEM = 1
+    TOPOLOGY_GRAPH = 2
+    TOPOLOGY_ARRAYS = 3
+
+# The ring records of one frame of the iterative traversal: the node the frame started from followed by the records the frame added.
+# All frames append to one record list, a frame only ever adds to or truncates the end of it, so the records of the frame
+# are always the tail of the list starting at the length the list had when the frame was created.
+class RingRecordsFrameView:
+    def __init__(self, records : List[Union[MvNodeRecord, MvCableRecord]], head : MvNodeRecord):
+        self.records = records
+        self.head = head
+        self.start = len(records)
+        self.is_cleared = False
+
+    def __len__(self) -> int:
+        if self.is_cleared:
+            return len(self.records) - self.start
+        return len(self.records) - self.start + 1
+
+    def __getitem__(self, index : int) -> Union[MvNodeRecord, MvCableRecord]:
+        if index < 0:
+            index += len(self)
+        if not self.is_cleared:
+            if index == 0:
+                return self.head
+            index -= 1
+        return self.records[self.start + index]
+
+    def append(self, record : Union[MvNodeRecord, MvCableRecord]):
+        self.records.append(record)
+
+    def clear(self):
+        del self.records[self.start:]
+        self.is_cleared = True
+
+# Running state of the ring records of one traversal frame: the last commissioning year known in the frame and the
+# segment of the cables added since the last transformer of the frame, so cable types are assigned without scanning back
+@dataclass
+class MvRingSegmentState:
+    last_commissioning_year : int
+    open_segment : MvCableSegment = field(default_factory=MvCableSegment)
+
+# State of one call of the recursive traversal, kept on the explicit stack of the iterative traversal
+@dataclass
+class MvTraversalFrame:
+    navigation_line_string : NavigationLineString
+    from_node : MvNodeWithMetaData
+    ring_records : RingRecordsFrameView
+    ring_state : MvRingSegmentState
+    next_navigation_line_strings : List[NavigationLineString] = None
+    next_navigation_line_strings_connected_to_station : List[NavigationLineString] = None
+    cleared : bool = False
+    branches : List[NavigationLineString] = None
+    branch_index : int = 0
+    ring_records_length_before_branches : int = 0
+
+# The mv network builder and hv stations the workers of a process pool generate networks from.
+# Set just before the pool is created so the forked workers inherit the parser indexes instead of receiving them pickled.
+_process_pool_state : tuple = None
+
+def _generate_mv_networks_of_station_in_process(arguments : tuple) -> List[Union[str, MvRingTopology]]:
+    name, starting_lines_container_index, save_network, output, skip_failed_rings = arguments
+    mv_network_builder, starting_lines_containers = _process_pool_state
+    visited = np.zeros(len(mv_network_builder.mv_line_store), dtype=bool)
+    mv_rings = mv_network_builder._iter_mv_rings_of_station(name, starting_lines_container_index, starting_lines_containers[starting_lines_container_index], visited, skip_failed_rings)
+    if output != MvNetworkOutput.ENERGY_SYSTEM:
+        # The graph of a topology is made in the parent process
+        return list(mv_network_builder._iter_mv_network_outputs(name, mv_rings, MvNetworkOutput.TOPOLOGY_ARRAYS, save_network, skip_failed_rings))
+    return [EsdlHelperFunctions.energy_system_to_string(mv_network) for mv_network in mv_network_builder._iter_mv_network_outputs(name, mv_rings, output, save_network, skip_failed_rings)]
+
 class MvNetworkBuilder:
-    def __init__(self, parser : NetworkParser, x_bottom_left : float, y_bottom_left : float, x_top_right : float, y_top_right : float):
+    def __init__(self, parser : NetworkParser, x_bottom_left : float, y_bottom_left : float, x_top_right : float, y_top_right : float, traversal_engine : MvTraversalEngine = MvTraversalEngine.ITERATIVE):
         self.str_tree_lv_lines : STRtree = parser.str_tree_lv_lines
         self.str_tree_mv_lines : STRtree = parser.str_tree_mv_lines
+        self.mv_line_incidence_index : LineIncidenceIndex = parser.mv_line_incidence_index
+        self.mv_line_store : LineStore = parser.mv_line_store
         self.parser = parser
         self.high_voltage_trafo_name = "HighVoltageTrafo"
         self.x_bottom_left = x_bottom_left
         self.y_bottom_left = y_bottom_left
         self.x_top_right = x_top_right
         self.y_top_right = y_top_right
-        self.all_visited_lines = []
+        self.all_visited_lines = set()
         self.starting_lines_containers : List[StationStartingLinesContainer] = []
         self.starting_lines_container_index = 0
         self.starting_line_index = 0
+        self.traversal_engine = traversal_engine
 
     def plot_mv_network(self, mv_network : esdl.EnergySystem):
         esdl_parser = EsdlNetworkParser(energy_system=mv_network)
@@ -41,6 +129,11 @@ class MvNetworkBuilder:
         plotter.plot_network(esdl_parser.all_lv_lines)
         plotter.show_plot()
 
+    def plot_mv_ring_topology(self, mv_ring_topology : MvRingTopology):
+        plotter = NetworkPlotter(1,1, False)
+        plotter.plot_network([self.mv_line_store.get_line_string(line_index) for line_index in mv_ring_topology.line_indices.tolist()])
+        plotter.show_plot()
+
     def _get_lines_connected_to_mv_station_at(self, navigation_line : NavigationLineString):
         connection_point = Point(self._get_end_coords_from_navigation_line_string(navigation_line))
         next_navigation_line_strings = self.parser.extract_mv_lines_connected_to_mv_lv_station_at_point(connection_point)
@@ -57,118 +150,121 @@ class MvNetworkBuilder:
         transformer.port.append(esdl.OutPort(id=str(uuid.uuid4()), name="Out"))
         return transformer
     
-    def _generate_esdl_cable(self, navigation_line_string : NavigationLineString) -> esdl.ElectricityCable:
-        cable = esdl.ElectricityCable(id=str(uuid.uuid4()), length=navigation_line_string.line_string.length, name=f"Cable{navigation_line_string.index}", assetType="testtype")
+    def _generate_esdl_cable(self, line_index : int) -> esdl.ElectricityCable:
+        cable = esdl.ElectricityCable(id=str(uuid.uuid4()), length=self.mv_line_store.get_length(line_index), name=f"Cable{line_index}", assetType="testtype")
         esdl_line = esdl.Line()
-        for p in navigation_line_string.line_string.coords:
+        for p in self.mv_line_store.get_line_string(line_index).coords:
             esdl_line.point.append(esdl.Point(lat=p[0], lon=p[1], CRS="WGS84"))
         cable.geometry = esdl_line
         cable.port.append(esdl.InPort(id=str(uuid.uuid4()), name="In"))
         cable.port.append(esdl.OutPort(id=str(uuid.uuid4()), name="Out"))
         return cable
 
-    
-
     def _connect_edge_to_nodes(self, from_node, esdl_cable, to_node):
         esdl_cable.port[1].connectedTo.append(to_node.port[0])
-        esdl_cable.port[0].connectedTo.append(from_node.esdl_obj.port[1])
-        from_node.esdl_obj.port[1].connectedTo.append(esdl_cable.port[0])
+        esdl_cable.port[0].connectedTo.append(from_node.port[1])
+        from_node.port[1].connectedTo.append(esdl_cable.port[0])
         to_node.port[0].connectedTo.append(esdl_cable.port[1])
-    
-    def _get_end_coords_from_navigation_line_string(self, navigation_line_string : NavigationLineString):
-        return navigation_line_string.line_string.coords[0] if navigation_line_string.first_point_end else navigation_line_string.line_string.coords[-1]
 
-    def _add_esdl_node_and_edge(self, navigation_line_string : NavigationLineString, from_node : EsdlAssetWithMetaData, to_node : esdl.ConnectableAsset, esdl_objs : List[esdl.ConnectableAsset]) -> EsdlAssetWithMetaData:
-        new_cable = self._generate_esdl_cable(navigation_line_string)
-        self._connect_edge_to_nodes(from_node, new_cable, to_node)
-        esdl_objs.append(new_cable)
-        esdl_objs.append(to_node)
-        return EsdlAssetWithMetaData(to_node, from_node.number + 1)
-
-    def _find_last_trafo_with_building_year(self, esdl_objs):
-        last_trafo_with_building_year = None
-        try:
-            last_trafo_with_building_year = next(esdl_obj for esdl_obj in reversed(esdl_objs) if (isinstance(esdl_obj, esdl.Transformer) or isinstance(esdl_obj, esdl.Joint)) and esdl_obj.commissioningDate != None and esdl_obj.commissioningDate != datetime.min)
-        except StopIteration:
-            raise ValueError(f"No building year found! ({esdl_objs[-1].geometry.lon}, {esdl_objs[-1].geometry.lat})")
-        return last_trafo_with_building_year
+    def _get_esdl_asset(self, record : Union[MvNodeRecord, MvCableRecord], esdl_objs : dict, generator_cable_case : GeneratorCableCase) -> esdl.ConnectableAsset:
+        # Creates the ESDL asset of a ring record with its port connections the first time it is needed
+        esdl_obj = esdl_objs.get(record)
+        if esdl_obj is None:
+            if isinstance(record, MvCableRecord):
+                esdl_obj = self._generate_esdl_cable(record.line_index)
+                if record.segment.cable_type_year is not None:
+                    esdl_obj.assetType = self.parser.define_cable_type_based_on_year(record.segment.cable_type_year, generator_cable_case)
+                if record.segment.commissioning_year is not None:
+                    esdl_obj.eSet("commissioningDate", datetime(record.segment.commissioning_year, 1, 1))
+                self._connect_edge_to_nodes(self._get_esdl_asset(record.from_node, esdl_objs, generator_cable_case), esdl_obj, self._get_esdl_asset(record.to_node, esdl_objs, generator_cable_case))
+            elif record.node_type == MvNodeType.TRANSFORMER:
+                commissioning_date = datetime(record.commissioning_year, 1, 1) if record.commissioning_year is not None else datetime.min
+                esdl_obj = self._generate_new_transformer(record.coords[0], record.coords[1], record.name, commissioning_date)
+                mv_node = self._get_esdl_asset(record.connected_node, esdl_objs, generator_cable_case)
+                esdl_obj.port[0].connectedTo.append(mv_node.port[1])
+                mv_node.port[1].connectedTo.append(esdl_obj.port[0])
+            else:
+                esdl_obj = EsdlHelperFunctions.generate_esdl_joint(record.coords[0], record.coords[1], record.name)
+                if record.commissioning_year is not None:
+                    esdl_obj.eSet("commissioningDate", datetime(record.commissioning_year, 1, 1))
+                if record.connected_node is not None:
+                    esdl_obj.port[0].connectedTo.append(self._get_esdl_asset(record.connected_node, esdl_objs, generator_cable_case).port[1])
+            esdl_objs[record] = esdl_obj
+        return esdl_obj
     
-    def _update_cable_types(self, year : int, esdl_objs : List[esdl.ConnectableAsset]):
-        last_trafo = self._find_last_trafo_with_building_year(esdl_objs)
-        trafo_year = 0
-        if last_trafo != None:
-            trafo_year = last_trafo.commissioningDate.year
-
+    def _get_end_coords_from_navigation_line_string(self, navigation_line_string : NavigationLineString):
+        return self.mv_line_store.get_end_coords(navigation_line_string)
+
+    def _add_node_and_edge(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, to_node : MvNodeRecord, ring_records : List[Union[MvNodeRecord, MvCableRecord]], ring_state : MvRingSegmentState) -> MvNodeWithMetaData:
+        ring_records.append(MvCableRecord(navigation_line_string.index, from_node.node, to_node, ring_state.open_segment))
+        ring_records.append(to_node)
+        return MvNodeWithMetaData(to_node, from_node.number + 1)
+
+    def _find_last_building_year(self, ring_records, ring_state : MvRingSegmentState) -> int:
+        if ring_state.last_commissioning_year is None:
+            last_record = ring_records[-1]
+            coords = last_record.coords if isinstance(last_record, MvNodeRecord) else last_record.to_node.coords
+            raise ValueError(f"No building year found! ({coords[1]}, {coords[0]})")
+        return ring_state.last_commissioning_year
+
+    def _update_cable_types(self, year : int, ring_records : List[Union[MvNodeRecord, MvCableRecord]], ring_state : MvRingSegmentState):
+        # All cables since the last transformer share the open segment, so they are all updated at once
+        trafo_year = self._find_last_building_year(ring_records, ring_state)
         cable_year = max(trafo_year, year)
-        for esdl_obj in reversed(esdl_objs):
-            if isinstance(esdl_obj, esdl.ElectricityCable):
-                esdl_obj.assetType = self.parser.define_cable_type_based_on_year(year)
-                esdl_obj.eSet("commissioningDate", datetime(cable_year, 1, 1))
-            if isinstance(esdl_obj, esdl.Transformer):
-                break
-
-    def _add_esdl_node_and_joint(self, navigation_line_string : NavigationLineString, from_node : EsdlAssetWithMetaData, esdl_objs : List[esdl.ConnectableAsset]):
-        coords = GeometryHelperFunctions.get_end_coords(navigation_line_string)
-        lat = coords[0]
-        long = coords[1]
-        to_node = EsdlHelperFunctions.generate_esdl_joint(lat, long, f"joint{from_node.number}")
-        return self._add_esdl_node_and_edge(navigation_line_string, from_node, to_node, esdl_objs)
-
-    def _add_esdl_node_and_transformer(self, navigation_line_string : NavigationLineString, from_node : EsdlAssetWithMetaData, esdl_objs : List[esdl.ConnectableAsset]):
-        coords = GeometryHelperFunctions.get_end_coords(navigation_line_string)
-        lat = coords[0]
-        long = coords[1]
-        building_year = self.parser.get_building_year_of_transformer_house_at_point(Point(lat, long))
-        to_transformer = self._generate_new_transformer(lat, long, f"transformer{from_node.number}")
-        to_node = EsdlHelperFunctions.generate_esdl_joint(lat, long, f"joint{from_node.number}")
-        to_transformer.port[0].connectedTo.append(to_node.port[1])
-        to_node.port[1].connectedTo.append(to_transformer.port[0])
-        from_node = self._add_esdl_node_and_edge(navigation_line_string, from_node, to_node, esdl_objs)
+        ring_state.open_segment.cable_type_year = year
+        ring_state.open_segment.commissioning_year = cable_year
+
+    def _add_node_and_joint(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, ring_records : List[Union[MvNodeRecord, MvCableRecord]], ring_state : MvRingSegmentState):
+        coords = self.mv_line_store.get_end_coords(navigation_line_string)
+        to_node = MvNodeRecord(MvNodeType.JOINT, f"joint{from_node.number}", coords)
+        return self._add_node_and_edge(navigation_line_string, from_node, to_node, ring_records, ring_state)
+
+    def _add_node_and_transformer(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, ring_records : List[Union[MvNodeRecord, MvCableRecord]], ring_state : MvRingSegmentState):
+        coords = self.mv_line_store.get_end_coords(navigation_line_string)
+        building_year = self.parser.get_building_year_of_transformer_house_at_point(Point(coords[0], coords[1]))
+        to_node = MvNodeRecord(MvNodeType.JOINT, f"joint{from_node.number}", coords)
+        to_transformer = MvNodeRecord(MvNodeType.TRANSFORMER, f"transformer{from_node.number}", coords, connected_node=to_node)
+        from_node = self._add_node_and_edge(navigation_line_string, from_node, to_node, ring_records, ring_state)
         from_node.number += 1
-        lv_transformer_node = EsdlHelperFunctions.generate_esdl_joint(lat, long, f"joint{from_node.number}")
-        lv_transformer_node.port[0].connectedTo.append(to_transformer.port[1])
-        esdl_objs.append(lv_transformer_node)
-        esdl_objs.append(to_transformer)
-        if building_year != 1:
-            to_transformer.eSet("commissioningDate", datetime(building_year, 1, 1))
-            to_node.eSet("commissioningDate", datetime(building_year, 1, 1))
-            self._update_cable_types(building_year, esdl_objs[:-1])
-        else:
-            last_trafo_building_year = self._find_last_trafo_with_building_year(esdl_objs)
-            to_transformer.eSet("commissioningDate", datetime(last_trafo_building_year.commissioningDate.year, 1, 1))
-            to_node.eSet("commissioningDate", datetime(last_trafo_building_year.commissioningDate.year, 1, 1))
-            self._update_cable_types(last_trafo_building_year.commissioningDate.year, esdl_objs[:-1])
+        lv_transformer_node = MvNodeRecord(MvNodeType.JOINT, f"joint{from_node.number}", coords, connected_node=to_transformer)
+        ring_records.append(lv_transformer_node)
+        if building_year == 1:
+            building_year = self._find_last_building_year(ring_records, ring_state)
+        to_transformer.commissioning_year = building_year
+        to_node.commissioning_year = building_year
+        ring_state.last_commissioning_year = building_year
+        self._update_cable_types(building_year, ring_records, ring_state)
+        # The transformer closes the segment, the cables after it get their own cable type
+        ring_records.append(to_transformer)
+        ring_state.open_segment = MvCableSegment()
         return from_node
 
-    def _add_loop_back_cable(self, navigation_line_string : NavigationLineString, from_node : esdl.ConnectableAsset, ret_val : List[esdl.ConnectableAsset], station_at_end_of_line : esdl.ConnectableAsset):
-        esdl_cable = self._generate_esdl_cable(navigation_line_string)
-        last_added_station = self._find_last_trafo_with_building_year(ret_val)
-        to_node = station_at_end_of_line
-        self._connect_edge_to_nodes(from_node, esdl_cable, to_node)
-        commisioning_year = max(to_node.commissioningDate.year, last_added_station.commissioningDate.year)
-        esdl_cable.commissioningDate = datetime(commisioning_year, 1, 1)
-        ret_val.append(esdl_cable)
-        self._update_cable_types(commisioning_year, ret_val)
-
-    def _build_mv_network_recursive(self, navigation_line_string : NavigationLineString, from_node : EsdlAssetWithMetaData, visited_lines : set, loops_mapping) -> List[esdl.ConnectableAsset]:
-        ret_val = [from_node.esdl_obj]
+    def _add_loop_back_cable(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, ret_val : List[Union[MvNodeRecord, MvCableRecord]], ring_state : MvRingSegmentState, station_at_end_of_line : MvNodeRecord):
+        last_building_year = self._find_last_building_year(ret_val, ring_state)
+        commisioning_year = max(station_at_end_of_line.commissioning_year, last_building_year)
+        ret_val.append(MvCableRecord(navigation_line_string.index, from_node.node, station_at_end_of_line, ring_state.open_segment))
+        self._update_cable_types(commisioning_year, ret_val, ring_state)
+
+    def _build_mv_network_recursive(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, visited_lines : set, loops_mapping) -> List[Union[MvNodeRecord, MvCableRecord]]:
+        ret_val = [from_node.node]
+        ring_state = MvRingSegmentState(from_node.node.commissioning_year)
         if navigation_line_string.index not in visited_lines:
             visited_lines.add(navigation_line_string.index)
             next_navigation_line_strings, next_navigation_line_strings_connected_to_station = self._define_next_lines(navigation_line_string, visited_lines)
             cleared = False
             while len(next_navigation_line_strings) + len(next_navigation_line_strings_connected_to_station) > 0:
-                coords = GeometryHelperFunctions.get_end_coords(navigation_line_string)
+                coords = self.mv_line_store.get_end_coords(navigation_line_string)
                 if len(next_navigation_line_strings_connected_to_station) > 1:
                     # Case the line ending has multiple branches
                     station_at_end_of_line = loops_mapping.get(coords, None)
                     if station_at_end_of_line != None:
                         # Case alogrithm has looped back to a point it has been before and next lines are found
-                        self._add_loop_back_cable(navigation_line_string, from_node, ret_val, station_at_end_of_line)
+                        self._add_loop_back_cable(navigation_line_string, from_node, ret_val, ring_state, station_at_end_of_line)
                     elif all(next_line_string_end_pair.index not in visited_lines for next_line_string_end_pair in next_navigation_line_strings_connected_to_station):
                         # Case alogrithm has found a new intersection of lines
-                        common_point = GeometryHelperFunctions.get_end_coords(navigation_line_string)
-                        from_node = self._add_esdl_node_and_transformer(navigation_line_string, from_node, ret_val)
-                        loops_mapping[common_point] = from_node.esdl_obj
+                        common_point = self.mv_line_store.get_end_coords(navigation_line_string)
+                        from_node = self._add_node_and_transformer(navigation_line_string, from_node, ret_val, ring_state)
+                        loops_mapping[common_point] = from_node.node
                     if (station_at_end_of_line != None and self.high_voltage_trafo_name not in station_at_end_of_line.name) or station_at_end_of_line == None:
                         # Only go deeper in recursion if the algorithm has not arrived back at the high voltage station it started
                         ret_val_len_old = len(ret_val)
@@ -187,23 +283,23 @@ class MvNetworkBuilder:
                     cleared = True
                 elif len(next_navigation_line_strings) == 1:
                     # The line has no branches
-                    from_node = self._add_esdl_node_and_joint(navigation_line_string, from_node, ret_val)
+                    from_node = self._add_node_and_joint(navigation_line_string, from_node, ret_val, ring_state)
                     navigation_line_string = next_navigation_line_strings[0]
                     visited_lines.add(navigation_line_string.index)
                     next_navigation_line_strings, next_navigation_line_strings_connected_to_station = self._define_next_lines(navigation_line_string, visited_lines)
 
                 elif len(next_navigation_line_strings_connected_to_station) == 1:
                     # The line is connected to an mv station
-                    from_node = self._add_esdl_node_and_transformer(navigation_line_string, from_node, ret_val)
+                    from_node = self._add_node_and_transformer(navigation_line_string, from_node, ret_val, ring_state)
                     navigation_line_string = next_navigation_line_strings_connected_to_station[0]
                     visited_lines.add(navigation_line_string.index)
                     next_navigation_line_strings, next_navigation_line_strings_connected_to_station = self._define_next_lines(navigation_line_string, visited_lines)
 
-            coords = GeometryHelperFunctions.get_end_coords(navigation_line_string)
+            coords = self.mv_line_store.get_end_coords(navigation_line_string)
             if len(next_navigation_line_strings) + len(next_navigation_line_strings_connected_to_station) == 0 and coords in loops_mapping and not cleared:
                 # Case we have looped back to a station but no next lines are found
                 visited_lines.add(navigation_line_string.index)
-                self._add_loop_back_cable(navigation_line_string, from_node, ret_val, loops_mapping[coords])
+                self._add_loop_back_cable(navigation_line_string, from_node, ret_val, ring_state, loops_mapping[coords])
             elif len(next_navigation_line_strings) == 0 and not cleared:
                 # Case we have reached a dead end 
                 # So we clear the asset list because we are only interested in mv rings
@@ -212,34 +308,118 @@ class MvNetworkBuilder:
 
         return ret_val
 
+    def _get_next_branch_frame(self, frame : MvTraversalFrame) -> MvTraversalFrame:
+        if frame.branch_index >= len(frame.branches):
+            return None
+        next_navigation_line_string = frame.branches[frame.branch_index]
+        frame.branch_index += 1
+        LOGGER.debug(f"Diving deeper in traversal at point {self.mv_line_store.get_end_coords(frame.navigation_line_string)}")
+        return MvTraversalFrame(next_navigation_line_string, frame.from_node, RingRecordsFrameView(frame.ring_records.records, frame.from_node.node), MvRingSegmentState(frame.from_node.node.commissioning_year))
+
+    def _advance_mv_traversal_frame(self, frame : MvTraversalFrame, visited_lines : set, loops_mapping) -> MvTraversalFrame:
+        # Continues the frame like _build_mv_network_recursive would, until it has to dive into a branch or is done.
+        # Returns the frame of the branch to dive into, or None when the frame is done.
+        if frame.branches is not None:
+            next_frame = self._get_next_branch_frame(frame)
+            if next_frame is not None:
+                return next_frame
+            if frame.ring_records_length_before_branches == len(frame.ring_records):
+                # Case we have only found dead ends so we do not have a medium voltage ring
+                frame.ring_records.clear()
+            frame.branches = None
+            frame.next_navigation_line_strings.clear()
+            frame.next_navigation_line_strings_connected_to_station.clear()
+            frame.cleared = True
+        elif frame.next_navigation_line_strings is None:
+            if frame.navigation_line_string.index in visited_lines:
+                return None
+            visited_lines.add(frame.navigation_line_string.index)
+            frame.next_navigation_line_strings, frame.next_navigation_line_strings_connected_to_station = self._define_next_lines(frame.navigation_line_string, visited_lines)
+
+        while len(frame.next_navigation_line_strings) + len(frame.next_navigation_line_strings_connected_to_station) > 0:
+            if len(frame.next_navigation_line_strings_connected_to_station) > 1:
+                # Case the line ending has multiple branches
+                coords = self.mv_line_store.get_end_coords(frame.navigation_line_string)
+                station_at_end_of_line = loops_mapping.get(coords, None)
+                if station_at_end_of_line != None:
+                    # Case alogrithm has looped back to a point it has been before and next lines are found
+                    self._add_loop_back_cable(frame.navigation_line_string, frame.from_node, frame.ring_records, frame.ring_state, station_at_end_of_line)
+                elif all(next_line_string_end_pair.index not in visited_lines for next_line_string_end_pair in frame.next_navigation_line_strings_connected_to_station):
+                    # Case alogrithm has found a new intersection of lines
+                    frame.from_node = self._add_node_and_transformer(frame.navigation_line_string, frame.from_node, frame.ring_records, frame.ring_state)
+                    loops_mapping[coords] = frame.from_node.node
+                if station_at_end_of_line == None or self.high_voltage_trafo_name not in station_at_end_of_line.name:
+                    # Only dive into the branches if the algorithm has not arrived back at the high voltage station it started
+                    frame.branches = frame.next_navigation_line_strings_connected_to_station
+                    frame.branch_index = 0
+                    frame.ring_records_length_before_branches = len(frame.ring_records)
+                    return self._get_next_branch_frame(frame)
+                frame.next_navigation_line_strings.clear()
+                frame.next_navigation_line_strings_connected_to_station.clear()
+                frame.cleared = True
+            elif len(frame.next_navigation_line_strings) == 1:
+                # The line has no branches
+                frame.from_node = self._add_node_and_joint(frame.navigation_line_string, frame.from_node, frame.ring_records, frame.ring_state)
+                frame.navigation_line_string = frame.next_navigation_line_strings[0]
+                visited_lines.add(frame.navigation_line_string.index)
+                frame.next_navigation_line_strings, frame.next_navigation_line_strings_connected_to_station = self._define_next_lines(frame.navigation_line_string, visited_lines)
+            elif len(frame.next_navigation_line_strings_connected_to_station) == 1:
+                # The line is connected to an mv station
+                frame.from_node = self._add_node_and_transformer(frame.navigation_line_string, frame.from_node, frame.ring_records, frame.ring_state)
+                frame.navigation_line_string = frame.next_navigation_line_strings_connected_to_station[0]
+                visited_lines.add(frame.navigation_line_string.index)
+                frame.next_navigation_line_strings, frame.next_navigation_line_strings_connected_to_station = self._define_next_lines(frame.navigation_line_string, visited_lines)
+
+        coords = self.mv_line_store.get_end_coords(frame.navigation_line_string)
+        if len(frame.next_navigation_line_strings) + len(frame.next_navigation_line_strings_connected_to_station) == 0 and coords in loops_mapping and not frame.cleared:
+            # Case we have looped back to a station but no next lines are found
+            visited_lines.add(frame.navigation_line_string.index)
+            self._add_loop_back_cable(frame.navigation_line_string, frame.from_node, frame.ring_records, frame.ring_state, loops_mapping[coords])
+        elif len(frame.next_navigation_line_strings) == 0 and not frame.cleared:
+            # Case we have reached a dead end
+            # So we clear the asset list because we are only interested in mv rings
+            visited_lines.add(frame.navigation_line_string.index)
+            frame.ring_records.clear()
+        return None
+
+    def _build_mv_network_iterative(self, navigation_line_string : NavigationLineString, from_node : MvNodeWithMetaData, visited_lines : set, loops_mapping) -> List[Union[MvNodeRecord, MvCableRecord]]:
+        # Same traversal as _build_mv_network_recursive, but with an explicit stack of frames instead of recursion.
+        # All frames add their records to one list, so no record lists are copied when returning from a branch.
+        records = []
+        root_frame = MvTraversalFrame(navigation_line_string, from_node, RingRecordsFrameView(records, from_node.node), MvRingSegmentState(from_node.node.commissioning_year))
+        stack = [root_frame]
+        while len(stack) > 0:
+            next_frame = self._advance_mv_traversal_frame(stack[-1], visited_lines, loops_mapping)
+            if next_frame is None:
+                stack.pop()
+            else:
+                stack.append(next_frame)
+        if not root_frame.ring_records.is_cleared:
+            records.insert(0, from_node.node)
+        return records
+
     def _remove_out_of_bounds_lines(self, next_navigation_line_strings : List[NavigationLineString]):
-        out_of_bounds_strings = [next_navigation_line_string for next_navigation_line_string in next_navigation_line_strings if 
-                                GeometryHelperFunctions.get_end_coords(next_navigation_line_string)[0] < self.x_bottom_left or 
-                                GeometryHelperFunctions.get_end_coords(next_navigation_line_string)[1] > self.y_top_right or 
-                                GeometryHelperFunctions.get_end_coords(next_navigation_line_string)[0] > self.x_top_right or 
-                                GeometryHelperFunctions.get_end_coords(next_navigation_line_string)[1] < self.y_bottom_left]
-        for out_of_bounds_string in out_of_bounds_strings:
-            next_navigation_line_strings.remove(out_of_bounds_string)
+        next_navigation_line_strings[:] = [next_navigation_line_string for next_navigation_line_string in next_navigation_line_strings if
+                                           self.x_bottom_left <= self.mv_line_store.get_end_coords(next_navigation_line_string)[0] <= self.x_top_right and
+                                           self.y_bottom_left <= self.mv_line_store.get_end_coords(next_navigation_line_string)[1] <= self.y_top_right]
 
     def _remove_duplicate_lines(self, visited_indices : set, next_navigation_line_strings : List[NavigationLineString]):
-        existing_lines = [navigation_line_string for navigation_line_string in next_navigation_line_strings if navigation_line_string.index in visited_indices]
-        for existing_line in existing_lines:
-            next_navigation_line_strings.remove(existing_line)
+        next_navigation_line_strings[:] = [navigation_line_string for navigation_line_string in next_navigation_line_strings if navigation_line_string.index not in visited_indices]
 
     def _get_next_lines_mv_network(self, navigation_line : NavigationLineString) -> List[NavigationLineString]:
-        next_navigation_line_strings = GeometryHelperFunctions.get_next_lines(self.str_tree_mv_lines, navigation_line)
+        next_navigation_line_strings = self.mv_line_incidence_index.get_next_lines(navigation_line)
         return next_navigation_line_strings
 
     def _define_next_lines(self, navigation_line_string, visited_indices):
         next_navigation_line_strings = self._get_next_lines_mv_network(navigation_line_string)
-        coords = GeometryHelperFunctions.get_end_coords(navigation_line_string)
+        coords = self.mv_line_store.get_end_coords(navigation_line_string)
         next_navigation_line_strings_connected_to_station = []
         if len(next_navigation_line_strings) == 0:
             next_navigation_line_strings_connected_to_station = self._get_lines_connected_to_mv_station_at(navigation_line_string)
             if len(next_navigation_line_strings_connected_to_station) == 0:
                 next_navigation_line_strings_connected_to_station = self.parser.extract_mv_lines_connected_to_hv_mv_station_at_point(Point(coords))
             if len(next_navigation_line_strings) == 0 and len(next_navigation_line_strings_connected_to_station) == 0:
-                next_navigation_line_strings_connected_to_station = self.parser.extract_mv_lines_that_are_connected_at_point(Point(GeometryHelperFunctions.get_end_coords(navigation_line_string)))
+                next_navigation_line_strings_connected_to_station = self.parser.extract_mv_lines_that_are_connected_at_point(Point(self.mv_line_store.get_end_coords(navigation_line_string)))
         self._remove_out_of_bounds_lines(next_navigation_line_strings)
         self._remove_duplicate_lines(visited_indices, next_navigation_line_strings)
         self._remove_duplicate_lines(visited_indices, next_navigation_line_strings_connected_to_station)
@@ -248,11 +428,13 @@ class MvNetworkBuilder:
     def _initialize_starting_parameters(self):
         if len(self.starting_lines_containers) == 0:
             self.starting_lines_containers = self.parser.extract_mv_lines_connected_to_hv_mv_station()
+            if len(self.starting_lines_containers) == 0:
+                raise ValueError("No hv stations found to start a MV network from")
 
         starting_line_container = self.starting_lines_containers[self.starting_lines_container_index]
 
-        starting_line = starting_line_container.starting_lines[self.starting_line_index]
-        while starting_line.index in self.all_visited_lines:
+        # Hv stations without starting lines are skipped like stations of which all starting lines are visited
+        while self.starting_line_index >= len(starting_line_container.starting_lines) or starting_line_container.starting_lines[self.starting_line_index].index in self.all_visited_lines:
             self.starting_line_index += 1
             if self.starting_line_index >= len(starting_line_container.starting_lines):
                 self.all_visited_lines.clear()
@@ -262,46 +444,204 @@ class MvNetworkBuilder:
                     self.starting_lines_container_index += 1
                 self.starting_line_index = 0
                 starting_line_container = self.starting_lines_containers[self.starting_lines_container_index]
-            starting_line = starting_line_container.starting_lines[self.starting_line_index]
+        starting_line = starting_line_container.starting_lines[self.starting_line_index]
+
+        return self._get_default_loops_mapping(starting_line_container), starting_line, starting_line_container.building_year
 
+    def _get_default_loops_mapping(self, starting_line_container : StationStartingLinesContainer) -> dict:
         default_loops_mapping = {}
         for sl in starting_line_container.starting_lines:
-            key = sl.line_string.coords[-1] if sl.first_point_end else sl.line_string.coords[0]
+            key = self.mv_line_store.get_connected_coords(sl)
             default_loops_mapping[key] = None
-
-        return default_loops_mapping, starting_line, starting_line_container.building_year
-
-    def generate_a_mv_network(self, name : str, save_network : bool = False) -> esdl.EnergySystem:
-        network_assets = []
-        while len(network_assets) == 0:
+        return default_loops_mapping
+
+    def _find_mv_ring(self, network_name : str, starting_line : NavigationLineString, building_year : int, default_loops_mapping : dict, visited_lines : set) -> MvRing:
+        # Returns None when no mv ring is found from the starting line, the lines that were visited are added to visited_lines
+        coords = self.mv_line_store.get_connected_coords(starting_line)
+        joint = MvNodeRecord(MvNodeType.JOINT, f"joint{self.high_voltage_trafo_name}", coords, building_year)
+        transformer = MvNodeRecord(MvNodeType.TRANSFORMER, self.high_voltage_trafo_name, coords, building_year, connected_node=joint)
+        loops_mapping = {key : joint for key in default_loops_mapping.keys()}
+        if self.traversal_engine == MvTraversalEngine.ITERATIVE:
+            ring_records = self._build_mv_network_iterative(starting_line, MvNodeWithMetaData(joint, 0), visited_lines, loops_mapping)
+        else:
+            ring_records = self._build_mv_network_recursive(starting_line, MvNodeWithMetaData(joint, 0), visited_lines, loops_mapping)
+        if len(ring_records) == 0:
+            return None
+        return MvRing(network_name, transformer, ring_records, starting_line)
+
+    def _create_mv_network(self, name : str, mv_ring : MvRing, generator_cable_case : GeneratorCableCase = None, file_name : str = None) -> esdl.EnergySystem:
+        # The ESDL assets are only created for a closed ring, the transformer first as it is the first connection of its joint.
+        # Without a cable case the cable case of the parser is used, with a file name the energy system is saved as well.
+        esh = EnergySystemHandler()
+        es = esh.create_empty_energy_system(name=mv_ring.name, es_description="Autogenerated based on gis data " + name,
+                                        inst_title="Instance name", area_title="Area name")
+        energy_system_information = esdl.EnergySystemInformation(id=str(uuid.uuid4()))
+        es.energySystemInformation = energy_system_information
+        esdl_objs = {}
+        esdl_transformer = self._get_esdl_asset(mv_ring.hv_transformer, esdl_objs, generator_cable_case)
+        EsdlHelperFunctions.add_new_assets_to_energy_system(es, [self._get_esdl_asset(record, esdl_objs, generator_cable_case) for record in mv_ring.records])
+        EsdlHelperFunctions.add_new_assets_to_energy_system(es, [esdl_transformer])
+        if file_name is not None:
+            EsdlFileWriter().write_energy_system(es, file_name)
+        return es
+
+    def _get_topology_node(self, record : MvNodeRecord, node_numbers : dict[MvNodeRecord, int], node_records : List[MvNodeRecord]) -> int:
+        # The transformer and lv joint of a station are connected to the joint on its mv side and get the node of that joint
+        node_number = node_numbers.get(record)
+        if node_number is None:
+            if record.connected_node is not None:
+                node_number = self._get_topology_node(record.connected_node, node_numbers, node_records)
+            else:
+                node_number = len(node_records)
+                node_records.append(record)
+            node_numbers[record] = node_number
+        return node_number
+
+    def _create_mv_ring_topology(self, mv_ring : MvRing, generator_cable_case : GeneratorCableCase = None) -> MvRingTopology:
+        # Made straight from the ring records, the hv station is node 0 and a station is named after its transformer
+        node_numbers = {}
+        node_records = []
+        station_names = {self._get_topology_node(mv_ring.hv_transformer, node_numbers, node_records) : mv_ring.hv_transformer.name}
+        cable_records = []
+        for record in mv_ring.records:
+            if isinstance(record, MvCableRecord):
+                cable_records.append(record)
+            elif record.node_type == MvNodeType.TRANSFORMER:
+                station_names[self._get_topology_node(record, node_numbers, node_records)] = record.name
+            else:
+                self._get_topology_node(record, node_numbers, node_records)
+        edges = np.array([(node_numbers[record.from_node], node_numbers[record.to_node]) for record in cable_records], dtype=np.int64).reshape(-1, 2)
+        line_indices = np.array([record.line_index for record in cable_records], dtype=np.int64)
+        commissioning_years = np.array([UNKNOWN_BUILDING_YEAR if record.segment.commissioning_year is None else record.segment.commissioning_year for record in cable_records], dtype=np.int16)
+        cable_types = ["testtype" if record.segment.cable_type_year is None else self.parser.define_cable_type_based_on_year(record.segment.cable_type_year, generator_cable_case) for record in cable_records]
+        # Every mv/lv station counts as one connection, on the first cable of the ring that ends at it
+        amount_of_connections = np.zeros(len(cable_records), dtype=np.int64)
+        connected_stations = {0}
+        for cable_index, to_node_number in enumerate(edges[:, 1].tolist()):
+            if to_node_number in station_names and to_node_number not in connected_stations:
+                amount_of_connections[cable_index] = 1
+                connected_stations.add(to_node_number)
+        node_names = [station_names.get(node_number, record.name) for node_number, record in enumerate(node_records)]
+        node_coords = np.array([record.coords for record in node_records], dtype=float).reshape(-1, 2)
+        # The starting line holds its own geometry, so the topology does not reference the line store when it is pickled
+        starting_line = NavigationLineString(self.mv_line_store.get_line_string(mv_ring.starting_line.index), mv_ring.starting_line.first_point_end, mv_ring.starting_line.index)
+        return MvRingTopology(mv_ring.name, starting_line, edges, line_indices, self.mv_line_store.lengths[line_indices], commissioning_years, cable_types, amount_of_connections, node_names, node_coords)
+
+    def _create_network_topology_info(self, mv_ring_topology : MvRingTopology) -> NetworkTopologyInfo:
+        # A multigraph, so the two cables of a ring between the hv station and a single station are both kept
+        network_topology = nx.MultiGraph()
+        for node_number, (node_name, coords) in enumerate(zip(mv_ring_topology.node_names, mv_ring_topology.node_coords.tolist())):
+            network_topology.add_node(node_number, name=node_name, coords=tuple(coords))
+        for (from_node, to_node), line_index, length, commissioning_year, cable_type, amount_of_connections in zip(mv_ring_topology.edges.tolist(), mv_ring_topology.line_indices.tolist(), mv_ring_topology.lengths.tolist(),
+                                                                                                                   mv_ring_topology.commissioning_years.tolist(), mv_ring_topology.cable_types, mv_ring_topology.amount_of_connections.tolist()):
+            network_topology.add_edge(from_node, to_node, length=length, amount_of_connections=amount_of_connections, line_index=line_index, commissioning_year=commissioning_year, cable_type=cable_type)
+        network_lines = [self.mv_line_store.get_line_string(line_index) for line_index in mv_ring_topology.line_indices.tolist()]
+        return NetworkTopologyInfo(network_lines, network_topology, mv_ring_topology.starting_line)
+
+    def _create_mv_network_output(self, name : str, mv_ring : MvRing, output : MvNetworkOutput, save_network : bool) -> Union[esdl.EnergySystem, NetworkTopologyInfo, MvRingTopology]:
+        if output == MvNetworkOutput.ENERGY_SYSTEM:
+            return self._create_mv_network(name, mv_ring, file_name=f"{mv_ring.name}.esdl" if save_network else None)
+        mv_ring_topology = self._create_mv_ring_topology(mv_ring)
+        if output == MvNetworkOutput.TOPOLOGY_ARRAYS:
+            return mv_ring_topology
+        return self._create_network_topology_info(mv_ring_topology)
+
+    @staticmethod
+    def _check_output(output : MvNetworkOutput, save_network : bool):
+        if save_network and output != MvNetworkOutput.ENERGY_SYSTEM:
+            raise ValueError(f"Only energy systems can be saved, not the output {output.name}")
+
+    def generate_a_mv_network(self, name : str, save_network : bool = False, output : MvNetworkOutput = MvNetworkOutput.ENERGY_SYSTEM) -> Union[esdl.EnergySystem, NetworkTopologyInfo, MvRingTopology]:
+        self._check_output(output, save_network)
+        mv_ring = None
+        while mv_ring is None:
             default_loops_mapping, starting_line, building_year = self._initialize_starting_parameters()
-
-            esh = EnergySystemHandler()
-            coords = GeometryHelperFunctions.get_connected_coords(starting_line)
-            trafo_commisioning_date = datetime(building_year, 1, 1)
-            
-            transformer = self._generate_new_transformer(coords[0], coords[1], name=self.high_voltage_trafo_name, commissioning_date=trafo_commisioning_date)
-            joint = EsdlHelperFunctions.generate_esdl_joint(coords[0], coords[1], name=f"joint{self.high_voltage_trafo_name}")
-            joint.commissioningDate = trafo_commisioning_date
-            transformer.port[0].connectedTo.append(joint.port[1])
-            joint.port[1].connectedTo.append(transformer.port[0])
-
             network_name = f"{name}-{self.starting_lines_container_index}.{self.starting_line_index}"
-            file_name = f"{network_name}.esdl"
-            es = esh.create_empty_energy_system(name=network_name, es_description="Autogenerated based on gis data " + name,
-                                            inst_title="Instance name", area_title="Area name")
-            for key in default_loops_mapping.keys():
-                default_loops_mapping[key] = joint
-
-            energy_system_information = esdl.EnergySystemInformation(id=str(uuid.uuid4()))
-            es.energySystemInformation = energy_system_information
-            loops_mapping = default_loops_mapping.copy()
             visited_lines = set()
-            network_assets = self._build_mv_network_recursive(starting_line, EsdlAssetWithMetaData(joint, 0), visited_lines, loops_mapping)
-            self.all_visited_lines.extend(visited_lines)
-            if len(network_assets) > 0:
-                EsdlHelperFunctions.add_new_assets_to_energy_system(es, network_assets)
-                EsdlHelperFunctions.add_new_assets_to_energy_system(es, [transformer])
-                if save_network:
-                    esh.save(file_name)
-        return es
\ No newline at end of file
+            mv_ring = self._find_mv_ring(network_name, starting_line, building_year, default_loops_mapping, visited_lines)
+            self.all_visited_lines.update(visited_lines)
+        return self._create_mv_network_output(name, mv_ring, output, save_network)
+
+    def _iter_mv_rings_of_station(self, name : str, starting_lines_container_index : int, starting_lines_container : StationStartingLinesContainer, visited : np.ndarray, skip_failed_rings : bool = False) -> Iterator[MvRing]:
+        # Lines visited from the station are marked in the boolean array and reset again once all its rings are found.
+        # When failed rings are skipped, the lines visited before the error are marked as well so the ring is not tried again.
+        default_loops_mapping = self._get_default_loops_mapping(starting_lines_container)
+        visited_by_station = []
+        for starting_line_index, starting_line in enumerate(starting_lines_container.starting_lines):
+            if visited[starting_line.index]:
+                continue
+            visited_lines = set()
+            network_name = f"{name}-{starting_lines_container_index}.{starting_line_index}"
+            try:
+                mv_ring = self._find_mv_ring(network_name, starting_line, starting_lines_container.building_year, default_loops_mapping, visited_lines)
+            except ValueError as exception:
+                if not skip_failed_rings:
+                    raise
+                LOGGER.warning(f"Skipping mv network {network_name}: {exception}")
+                mv_ring = None
+            visited_indices = np.fromiter(visited_lines, dtype=np.int64, count=len(visited_lines))
+            visited[visited_indices] = True
+            visited_by_station.append(visited_indices)
+            if mv_ring is not None:
+                yield mv_ring
+        for visited_indices in visited_by_station:
+            visited[visited_indices] = False
+
+    def _iter_mv_rings(self, name : str, starting_lines_containers : List[StationStartingLinesContainer], skip_failed_rings : bool = False) -> Iterator[MvRing]:
+        visited = np.zeros(len(self.mv_line_store), dtype=bool)
+        for starting_lines_container_index, starting_lines_container in enumerate(starting_lines_containers):
+            yield from self._iter_mv_rings_of_station(name, starting_lines_container_index, starting_lines_container, visited, skip_failed_rings)
+
+    def _iter_mv_network_outputs(self, name : str, mv_rings : Iterator[MvRing], output : MvNetworkOutput, save_network : bool, skip_failed_rings : bool) -> Iterator[Union[esdl.EnergySystem, NetworkTopologyInfo, MvRingTopology]]:
+        for mv_ring in mv_rings:
+            try:
+                mv_network_output = self._create_mv_network_output(name, mv_ring, output, save_network)
+            except ValueError as exception:
+                if not skip_failed_rings:
+                    raise
+                LOGGER.warning(f"Skipping mv network {mv_ring.name}: {exception}")
+                continue
+            yield mv_network_output
+
+    def _iter_mv_networks_in_process_pool(self, name : str, starting_lines_containers : List[StationStartingLinesContainer], save_network : bool, processes : int, output : MvNetworkOutput, skip_failed_rings : bool) -> Iterator[Union[esdl.EnergySystem, NetworkTopologyInfo, MvRingTopology]]:
+        # Every hv station is explored by a worker on its own. Stations do not share any traversal state, so the rings
+        # are the same as those of a sequential run and they are returned in the same order, station by station.
+        # Networks are sent back to the parent process as ESDL strings, topologies as MvRingTopology arrays.
+        global _process_pool_state
+        _process_pool_state = (self, starting_lines_containers)
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                tasks = [(name, starting_lines_container_index, save_network, output, skip_failed_rings) for starting_lines_container_index in range(len(starting_lines_containers))]
+                for station_outputs in pool.imap(_generate_mv_networks_of_station_in_process, tasks):
+                    for station_output in station_outputs:
+                        if output == MvNetworkOutput.ENERGY_SYSTEM:
+                            yield EsdlHelperFunctions.energy_system_from_string(station_output)
+                        elif output == MvNetworkOutput.TOPOLOGY_GRAPH:
+                            yield self._create_network_topology_info(station_output)
+                        else:
+                            yield station_output
+        finally:
+            _process_pool_state = None
+
+    def iter_mv_networks(self, name : str, save_network : bool = False, processes : int = 1, output : MvNetworkOutput = MvNetworkOutput.ENERGY_SYSTEM, skip_failed_rings : bool = False) -> Iterator[Union[esdl.EnergySystem, NetworkTopologyInfo, MvRingTopology]]:
+        # Yields every mv ring of every hv station in one pass, in the same order and with the same names as
+        # repeated calls of generate_a_mv_network. With more than one process the hv stations are spread over a process pool.
+        # With skip_failed_rings a ring failing with a ValueError is logged and skipped instead of ending the iteration.
+        if processes < 1:
+            raise ValueError(f"Amount of processes should be at least 1, got {processes}")
+        self._check_output(output, save_network)
+        starting_lines_containers = self.parser.extract_mv_lines_connected_to_hv_mv_station()
+        if processes > 1 and len(starting_lines_containers) > 1:
+            if "fork" in multiprocessing.get_all_start_methods():
+                yield from self._iter_mv_networks_in_process_pool(name, starting_lines_containers, save_network, min(processes, len(starting_lines_containers)), output, skip_failed_rings)
+                return
+            LOGGER.warning("Processes can not be forked on this platform, the mv networks are generated sequentially")
+        yield from self._iter_mv_network_outputs(name, self._iter_mv_rings(name, starting_lines_containers, skip_failed_rings), output, save_network, skip_failed_rings)
+
+    def iter_mv_network_variants(self, name : str, generator_cable_cases : List[GeneratorCableCase] = None, save_network : bool = False) -> Iterator[dict[GeneratorCableCase, esdl.EnergySystem]]:
+        # Like iter_mv_networks, but every ring is traversed once and turned into an energy system per cable case,
+        # by default one for every GeneratorCableCase. Saved networks get the name of their cable case appended.
+        if generator_cable_cases is None:
+            generator_cable_cases = list(GeneratorCableCase)
+        for mv_ring in self._iter_mv_rings(name, self.parser.extract_mv_lines_connected_to_hv_mv_station()):
+            yield {generator_cable_case : self._create_mv_network(name, mv_ring, generator_cable_case, f"{mv_ring.name}-{generator_cable_case.name}.esdl" if save_network else None) for generator_cable_case in generator_cable_cases}
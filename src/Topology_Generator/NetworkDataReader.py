@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+import importlib.util
+import os
+
+import geopandas
+import numpy as np
+import pyogrio
+import shapely
+
+from Topology_Generator.BagBuildingData import BAG_COLUMNS, BagBuildingData
+from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase, GeoDataNetworkParser
+
+BoundingBox = Tuple[float, float, float, float]
+
+ALLIANDER_LAYERS = {
+    "lv_lines" : "laagspanningskabels",
+    "mv_lv_stations" : "middenspanningsinstallaties",
+    "mv_lines" : "middenspanningskabels",
+    "hv_stations" : "onderstations",
+}
+
+@dataclass
+class NetworkData:
+    lv_lines : geopandas.GeoDataFrame
+    mv_lv_stations : geopandas.GeoDataFrame
+    mv_lines : geopandas.GeoDataFrame
+    hv_stations : geopandas.GeoDataFrame
+    bag_building_data : BagBuildingData
+
+# Reads the network layers and the BAG buildings needed by the geo data parsers.
+# Every layer is read once for the union of all requested bboxes, with only the columns the parsers use,
+# and is then split per bbox in memory. Sources are either GeoPackages or GeoParquet files,
+# a directory is read as one GeoParquet file per layer named after the layer.
+# When pyarrow is installed the GeoPackage layers are read through the Arrow stream of pyogrio.
+# pyogrio reads one layer per call and opens the GeoPackage for each of them, there is no way to read several layers
+# from one open dataset. Opening a GeoPackage only opens its SQLite file, the layer reads themselves are the cost,
+# which is why read takes all bboxes at once: every layer is then opened and read once for all of them.
+class NetworkDataReader:
+    def __init__(self, network_data_path : str, bag_data_path : str, layers : dict[str, str] = ALLIANDER_LAYERS, bag_layer : str = "pand"):
+        self.network_data_path = network_data_path
+        self.bag_data_path = bag_data_path
+        self.layers = layers
+        self.bag_layer = bag_layer
+        self.use_arrow = importlib.util.find_spec("pyarrow") is not None
+
+    @staticmethod
+    def _get_union_bbox(bboxes : List[BoundingBox]) -> BoundingBox:
+        bboxes = np.asarray(bboxes, dtype=float)
+        return (bboxes[:, 0].min(), bboxes[:, 1].min(), bboxes[:, 2].max(), bboxes[:, 3].max())
+
+    def _read_layer(self, path : str, layer : str, bbox : BoundingBox, columns : List[str]) -> geopandas.GeoDataFrame:
+        if os.path.isdir(path):
+            path = os.path.join(path, f"{layer}.parquet")
+        if path.endswith(".parquet"):
+            if importlib.util.find_spec("pyarrow") is None:
+                raise ValueError(f"Reading GeoParquet file {path} requires pyarrow to be installed")
+            geo_df = geopandas.read_parquet(path, columns=columns + ["geometry"], bbox=bbox)
+            return geo_df.reset_index(drop=True)
+        return pyogrio.read_dataframe(path, layer=layer, bbox=bbox, columns=columns, use_arrow=self.use_arrow)
+
+    @staticmethod
+    def _select_bbox(geo_df : geopandas.GeoDataFrame, bbox : BoundingBox) -> geopandas.GeoDataFrame:
+        if geo_df.empty:
+            return geo_df
+        # Like the bbox filter of a read, a feature is selected when its bounding box intersects the bbox
+        indices = np.sort(geo_df.sindex.query(shapely.box(*bbox)))
+        return geo_df.take(indices).reset_index(drop=True)
+
+    def read(self, bboxes : List[BoundingBox]) -> List[NetworkData]:
+        if len(bboxes) == 0:
+            return []
+        union_bbox = self._get_union_bbox(bboxes)
+        network_layers = {key : self._read_layer(self.network_data_path, layer, union_bbox, []) for key, layer in self.layers.items()}
+        geo_df_bag_data = self._read_layer(self.bag_data_path, self.bag_layer, union_bbox, BAG_COLUMNS)
+        ret_val = []
+        for bbox in bboxes:
+            selected_layers = {key : self._select_bbox(geo_df, bbox) for key, geo_df in network_layers.items()}
+            ret_val.append(NetworkData(selected_layers["lv_lines"], selected_layers["mv_lv_stations"], selected_layers["mv_lines"], selected_layers["hv_stations"], BagBuildingData.from_geo_data_frame(self._select_bbox(geo_df_bag_data, bbox))))
+        return ret_val
+
+    def read_bbox(self, bbox : BoundingBox) -> NetworkData:
+        return self.read([bbox])[0]
+
+    @staticmethod
+    def create_parser(network_data : NetworkData, parser_class : type, generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG) -> GeoDataNetworkParser:
+        return parser_class(network_data.lv_lines, network_data.mv_lv_stations, network_data.bag_building_data, network_data.mv_lines, network_data.hv_stations, generator_cable_case)
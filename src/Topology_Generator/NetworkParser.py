@@ -1,9 +1,15 @@
 from dataclasses import dataclass
 from typing import List
 from shapely import STRtree, LineString, Point
+import numpy as np
 
+from Topology_Generator.LineIncidenceIndex import LineIncidenceIndex
+from Topology_Generator.LineStore import LineStore
 from Topology_Generator.dataclasses import NavigationLineString
 
+# Station lookups are cached per point, a cache is emptied once it holds this many points so it does not grow over a whole run
+STATION_INDEX_CACHE_SIZE = 65536
+
 @dataclass
 class StationStartingLinesContainer:
     starting_lines : List[NavigationLineString]
@@ -11,10 +17,37 @@ class StationStartingLinesContainer:
 
 class NetworkParser:
     def __init__(self):
-        self.all_lv_lines = self._extract_lv_network_lines()
-        self.str_tree_lv_lines = STRtree(self.all_lv_lines)
-        self.all_mv_lines = self._extract_mv_network_lines()
-        self.str_tree_mv_lines = STRtree(self.all_mv_lines)
+        self._init_line_stores(LineStore.from_lines(self._extract_lv_network_lines()), LineStore.from_lines(self._extract_mv_network_lines()))
+
+    def _init_line_stores(self, lv_line_store : LineStore, mv_line_store : LineStore):
+        self.lv_line_store = lv_line_store
+        self.str_tree_lv_lines = STRtree(self.lv_line_store.geometries)
+        self.lv_line_incidence_index = LineIncidenceIndex(self.lv_line_store)
+        self.mv_line_store = mv_line_store
+        self.str_tree_mv_lines = STRtree(self.mv_line_store.geometries)
+        self.mv_line_incidence_index = LineIncidenceIndex(self.mv_line_store)
+
+    @property
+    def all_lv_lines(self) -> List[LineString]:
+        return self.lv_line_store.get_line_strings()
+
+    @property
+    def all_mv_lines(self) -> List[LineString]:
+        return self.mv_line_store.get_line_strings()
+
+    def get_line_incidence_index(self, str_tree_lines : STRtree) -> LineIncidenceIndex:
+        if str_tree_lines is self.str_tree_mv_lines:
+            return self.mv_line_incidence_index
+        if str_tree_lines is self.str_tree_lv_lines:
+            return self.lv_line_incidence_index
+        raise ValueError("The tree is neither the lv nor the mv line tree of the parser, no line incidence index belongs to it")
+
+    def get_line_store(self, str_tree_lines : STRtree) -> LineStore:
+        if str_tree_lines is self.str_tree_mv_lines:
+            return self.mv_line_store
+        if str_tree_lines is self.str_tree_lv_lines:
+            return self.lv_line_store
+        raise ValueError("The tree is neither the lv nor the mv line tree of the parser, no line store belongs to it")
 
     def _extract_lv_network_lines(self) -> List[LineString]:
         return []
@@ -36,6 +69,9 @@ class NetworkParser:
     
     def get_building_year_of_building_at_point(self, point : Point) -> int:
         return -1
+
+    def get_building_years_of_buildings_at_points(self, geometries) -> np.ndarray:
+        return np.full(len(geometries), -1, dtype=np.int64)
     
     def extract_mv_lines_that_are_connected_at_point(self, point : Point):
         return []
@@ -49,11 +85,11 @@ class NetworkParser:
     def extract_mv_lines_connected_to_hv_mv_station(self) -> List[StationStartingLinesContainer]:
         return []
 
-    def get_amount_of_connections_bordering_line(self, line_string : LineString) -> int:
+    def get_amount_of_connections_bordering_line(self, line_index : int) -> int:
         return 0
 
     def get_line_length_from_metadata(self, line_string : LineString) -> float:
         return 0.0
     
-    def define_cable_type_based_on_year(self, building_year):
+    def define_cable_type_based_on_year(self, building_year, generator_cable_case = None):
         return f"{building_year}-type"
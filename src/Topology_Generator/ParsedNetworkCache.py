@@ -0,0 +1,69 @@
+from typing import Callable, List, Tuple
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase, GeoDataNetworkParser
+from Topology_Generator.Logging import LOGGER
+
+# Increase when the layout of the parsed state changes so old cache entries are no longer used
+CACHE_FORMAT_VERSION = 4
+
+# Stores the preprocessed state of geo data network parsers on disk, one directory of .npy files per cache entry.
+# An entry is identified by the parser class, the bbox and the path, size and modification time of every input file,
+# so a changed input file results in a new entry. Entries are memory mapped on load so a warm start reads lazily.
+class ParsedNetworkCache:
+    def __init__(self, cache_directory : str):
+        self.cache_directory = cache_directory
+
+    @staticmethod
+    def get_file_fingerprint(path : str) -> Tuple[str, int, int]:
+        file_stat = os.stat(path)
+        return (os.path.abspath(path), file_stat.st_size, file_stat.st_mtime_ns)
+
+    def get_cache_key(self, parser_class : type, input_files : List[str], bbox : Tuple[float, float, float, float]) -> str:
+        fingerprints = [self.get_file_fingerprint(path) for path in sorted(input_files)]
+        key_source = repr((CACHE_FORMAT_VERSION, parser_class.__module__, parser_class.__qualname__, tuple(float(value) for value in bbox), fingerprints))
+        return hashlib.sha256(key_source.encode()).hexdigest()
+
+    def _get_entry_directory(self, key : str) -> str:
+        return os.path.join(self.cache_directory, key)
+
+    def contains(self, key : str) -> bool:
+        return os.path.isdir(self._get_entry_directory(key))
+
+    def save(self, key : str, parser : GeoDataNetworkParser):
+        entry_directory = self._get_entry_directory(key)
+        temporary_directory = f"{entry_directory}.tmp-{os.getpid()}"
+        os.makedirs(temporary_directory, exist_ok=True)
+        for name, array in parser.get_parsed_state().items():
+            np.save(os.path.join(temporary_directory, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        # The entry only becomes visible once it is complete
+        try:
+            os.replace(temporary_directory, entry_directory)
+        except OSError:
+            # Another process stored the same entry in the meantime
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+    def load(self, key : str, parser_class : type, generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG) -> GeoDataNetworkParser:
+        entry_directory = self._get_entry_directory(key)
+        if not os.path.isdir(entry_directory):
+            raise ValueError(f"No parsed network state cached for key {key}")
+        state = {}
+        for file_name in os.listdir(entry_directory):
+            if file_name.endswith(".npy"):
+                state[file_name[:-len(".npy")]] = np.load(os.path.join(entry_directory, file_name), mmap_mode="r", allow_pickle=False)
+        return parser_class.from_parsed_state(state, generator_cable_case)
+
+    def get_parser(self, parser_class : type, input_files : List[str], bbox : Tuple[float, float, float, float], create_parser : Callable[[], GeoDataNetworkParser], generator_cable_case : GeneratorCableCase = GeneratorCableCase.AVG) -> GeoDataNetworkParser:
+        key = self.get_cache_key(parser_class, input_files, bbox)
+        if self.contains(key):
+            LOGGER.info(f"Loading parsed network state from cache entry {key}")
+            return self.load(key, parser_class, generator_cable_case)
+        parser = create_parser()
+        # The cable case is not part of the cached state, so the parser of a cold start gets the requested one as well
+        parser.generator_cable_case = generator_cable_case
+        self.save(key, parser)
+        return parser
@@ -0,0 +1,69 @@
+from typing import Callable, Iterator, List, Tuple
+import gc
+
+import esdl
+from Topology_Generator.EsdlHelperFunctions import EsdlHelperFunctions
+from Topology_Generator.Logging import LOGGER
+from Topology_Generator.MvNetworkBuilder import MvNetworkBuilder
+from Topology_Generator.NetworkParser import NetworkParser
+
+BoundingBox = Tuple[float, float, float, float]
+
+# Generates all mv networks of a large region by splitting it into tiles.
+# Every tile is parsed and explored on its own, extended with a halo so rings crossing the tile border are still found complete.
+# Rings found in the overlapping halos of several tiles are only returned once.
+class TiledMvNetworkGenerator:
+    def __init__(self, parser_factory : Callable[[BoundingBox], NetworkParser], region_bbox : BoundingBox, tile_size : float, halo : float):
+        if tile_size <= 0:
+            raise ValueError(f"Tile size should be positive, got {tile_size}")
+        if halo < 0:
+            raise ValueError(f"Halo should not be negative, got {halo}")
+        self.parser_factory = parser_factory
+        self.region_bbox = region_bbox
+        self.tile_size = tile_size
+        self.halo = halo
+        self.found_ring_keys = set()
+
+    def get_tiles(self) -> List[BoundingBox]:
+        x_bottom_left, y_bottom_left, x_top_right, y_top_right = self.region_bbox
+        ret_val = []
+        y = y_bottom_left
+        while y < y_top_right:
+            x = x_bottom_left
+            while x < x_top_right:
+                ret_val.append((x, y, min(x + self.tile_size, x_top_right), min(y + self.tile_size, y_top_right)))
+                x += self.tile_size
+            y += self.tile_size
+        return ret_val
+
+    def get_tile_with_halo(self, tile : BoundingBox) -> BoundingBox:
+        return (tile[0] - self.halo, tile[1] - self.halo, tile[2] + self.halo, tile[3] + self.halo)
+
+    @staticmethod
+    def get_ring_key(mv_network : esdl.EnergySystem) -> frozenset:
+        # Line indices are local to the parser of a tile, so a ring is identified by the end points of its cables instead
+        assets = mv_network.instance[0].area.asset
+        electricity_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(assets, esdl.ElectricityCable)
+        return frozenset(frozenset(((round(cable.geometry.point[0].lat, 3), round(cable.geometry.point[0].lon, 3)),
+                                    (round(cable.geometry.point[-1].lat, 3), round(cable.geometry.point[-1].lon, 3)))) for cable in electricity_cables)
+
+    def _generate_mv_networks_in_tile(self, tile_index : int, tile : BoundingBox, name : str) -> Iterator[esdl.EnergySystem]:
+        tile_with_halo = self.get_tile_with_halo(tile)
+        network_parser = self.parser_factory(tile_with_halo)
+        mv_network_builder = MvNetworkBuilder(network_parser, *tile_with_halo)
+        # A ring failing on its data is logged and skipped, the other rings of the tile are still generated
+        for mv_network in mv_network_builder.iter_mv_networks(f"{name}-{tile_index}", skip_failed_rings=True):
+            ring_key = self.get_ring_key(mv_network)
+            if ring_key in self.found_ring_keys:
+                LOGGER.debug(f"Skipping mv network {mv_network.name} which was already found in another tile")
+                continue
+            self.found_ring_keys.add(ring_key)
+            yield mv_network
+
+    def generate_mv_networks(self, name : str) -> Iterator[esdl.EnergySystem]:
+        tiles = self.get_tiles()
+        for tile_index, tile in enumerate(tiles):
+            LOGGER.info(f"Generating mv networks in tile {tile_index + 1}/{len(tiles)} {tile}")
+            yield from self._generate_mv_networks_in_tile(tile_index, tile, name)
+            # Release the data of the finished tile before the next one is parsed
+            gc.collect()
@@ -1,14 +1,95 @@
 from dataclasses import dataclass
-from typing import List
+from enum import Enum
+from typing import List, Union
 import esdl
 from networkx import Graph
+import numpy as np
 from shapely import LineString
 
-@dataclass
+# Handle to a line that is being navigated, a line is identified by its index and the side it is navigated towards.
+# The geometry is either given directly or looked up in the line store of the parser when it is first needed.
 class NavigationLineString:
-    line_string : LineString
-    first_point_end : bool
-    index : int
+    __slots__ = ("_line_string", "first_point_end", "index", "line_store")
+
+    def __init__(self, line_string : LineString, first_point_end : bool, index : int, line_store = None):
+        self._line_string = line_string
+        self.first_point_end = first_point_end
+        self.index = index
+        self.line_store = line_store
+
+    @staticmethod
+    def from_line_store(line_store, index : int, first_point_end : bool) -> "NavigationLineString":
+        return NavigationLineString(None, first_point_end, index, line_store)
+
+    @property
+    def line_string(self) -> LineString:
+        if self._line_string is None:
+            self._line_string = self.line_store.get_line_string(self.index)
+        return self._line_string
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, NavigationLineString):
+            return False
+        return self.index == other.index and self.first_point_end == other.first_point_end
+
+    def __hash__(self) -> int:
+        return hash((self.index, self.first_point_end))
+
+    def __repr__(self) -> str:
+        return f"NavigationLineString(index={self.index}, first_point_end={self.first_point_end})"
+
+class MvNodeType(Enum):
+    JOINT = 1
+    TRANSFORMER = 2
+
+# Node of an mv ring found by the traversal, its ESDL asset is only created once the ring closes.
+# A transformer is connected to the joint on its mv side, a joint on the lv side of a transformer to that transformer.
+@dataclass(eq=False)
+class MvNodeRecord:
+    node_type : MvNodeType
+    name : str
+    coords : tuple[float, float]
+    commissioning_year : int = None
+    connected_node : "MvNodeRecord" = None
+
+# Year the cable type is based on and commissioning year, shared by the consecutive cables of an mv ring up to the next transformer.
+# The cable type itself is only looked up when the ring is turned into ESDL, so one ring can get the cable types of every cable case.
+@dataclass(eq=False)
+class MvCableSegment:
+    cable_type_year : int = None
+    commissioning_year : int = None
+
+# Cable of an mv ring found by the traversal, the line of the parser it follows, the nodes it connects and its segment
+@dataclass(eq=False)
+class MvCableRecord:
+    line_index : int
+    from_node : MvNodeRecord
+    to_node : MvNodeRecord
+    segment : MvCableSegment
+
+# An mv ring found from a starting line: its name, the hv transformer it starts from and the records of its assets
+@dataclass(eq=False)
+class MvRing:
+    name : str
+    hv_transformer : MvNodeRecord
+    records : List[Union[MvNodeRecord, MvCableRecord]]
+    starting_line : NavigationLineString = None
+
+# Topology of an mv ring without any ESDL assets, as arrays with one entry per cable.
+# Cable i follows line line_indices[i] of the parser from node edges[i, 0] to node edges[i, 1]. A node is a joint or a station,
+# the joints and transformer of a station share one node. Amount of connections is 1 for a cable ending at an mv/lv station.
+@dataclass(eq=False)
+class MvRingTopology:
+    name : str
+    starting_line : NavigationLineString
+    edges : np.ndarray
+    line_indices : np.ndarray
+    lengths : np.ndarray
+    commissioning_years : np.ndarray
+    cable_types : List[str]
+    amount_of_connections : np.ndarray
+    node_names : List[str]
+    node_coords : np.ndarray
 
 class NetworkTopologyInfo:
     def __init__(self, network_lines : List[LineString], network_topology : Graph, starting_line : NavigationLineString):
@@ -2,9 +2,20 @@
 from Topology_Generator.AllianderGeoDataNetworkParser import AllianderGeoDataNetworkParser
 from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase
 from Topology_Generator.MvNetworkBuilder import MvNetworkBuilder
-import geopandas
+from Topology_Generator.NetworkDataReader import NetworkDataReader
+
+def create_network_data_reader():
+    # Alliander layers and bag data, each layer is read once with only the columns the parser uses
+    lv_lines_gpkg = "<<path_to_your_gpkg>>/alliander-lv-lines.gpkg"
+    bag_data_gpkg = "<<path_to_your_gpkg>>/bag-data.gpkg"
+    return NetworkDataReader(lv_lines_gpkg, bag_data_gpkg)
+
+def create_network_parser(network_data_reader : NetworkDataReader, bbox):
+    generator_cable_case = GeneratorCableCase.THICK
+    return NetworkDataReader.create_parser(network_data_reader.read_bbox(bbox), AllianderGeoDataNetworkParser, generator_cable_case)
 
 def main():
+    network_data_reader = create_network_data_reader()
 
     x_bottom_left = 157384
     y_bottom_left = 432937
@@ -12,18 +23,7 @@ def main():
     y_top_right = 434915
     bbox = (x_bottom_left, y_bottom_left, x_top_right, y_top_right)
 
-    # Bag data
-    bag_data_gpkg = "<<path_to_your_gpkg>>/bag-data.gpkg"
-    geo_df_bag_data : geopandas.GeoDataFrame = geopandas.read_file(bag_data_gpkg, layer='pand', bbox=bbox)
-
-    # Alliander
-    lv_lines_gpkg = "<<path_to_your_gpkg>>/alliander-lv-lines.gpkg"
-    geo_df_lv_lines : geopandas.GeoDataFrame = geopandas.read_file(lv_lines_gpkg, layer='laagspanningskabels', bbox=bbox)
-    geo_df_mv_lv_stations : geopandas.GeoDataFrame = geopandas.read_file(lv_lines_gpkg, layer='middenspanningsinstallaties', bbox=bbox)
-    geo_df_mv_kabels : geopandas.GeoDataFrame = geopandas.read_file(lv_lines_gpkg, layer='middenspanningskabels', bbox=bbox)
-    geo_df_hv_stations : geopandas.GeoDataFrame = geopandas.read_file(lv_lines_gpkg, layer='onderstations', bbox=bbox)
-    generator_cable_case = GeneratorCableCase.THICK
-    network_parser = AllianderGeoDataNetworkParser(geo_df_lv_lines, geo_df_mv_lv_stations, geo_df_bag_data, geo_df_mv_kabels, geo_df_hv_stations, generator_cable_case)
+    network_parser = create_network_parser(network_data_reader, bbox)
     
     mv_network_builder = MvNetworkBuilder(network_parser, x_bottom_left, y_bottom_left, x_top_right, y_top_right)
 
@@ -0,0 +1,100 @@
+import unittest
+import esdl
+import geopandas
+from shapely import LineString, Polygon, Point
+
+from Topology_Generator.AllianderGeoDataNetworkParser import AllianderGeoDataNetworkParser
+from Topology_Generator.EsdlNetworkParser import EsdlNetworkParser
+from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase
+from Topology_Generator.MvNetworkBuilder import MvNetworkBuilder
+from Topology_Generator.dataclasses import NavigationLineString
+
+class TestEsdlNetworkParser(unittest.TestCase):
+
+    def setUp(self):
+        df_hv_mv_station = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": [Point((1,1))]
+            }
+        )
+        df_bag_data = geopandas.GeoDataFrame(
+            {
+                "id": [1,2],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (2, 0)]), Polygon([(38, 29), (40, 29), (40, 31), (38, 31)])],
+                "bouwjaar" : [2003, 1984]
+            }
+        )
+        mv_lines = [LineString([(2, 1), (22, 1)]),
+                LineString([(22, 1), (50, 1)]),
+                LineString([(50, 1.1), (40, 1.1)]),
+                LineString([(40, 1.1), (40, 30)]),
+                LineString([(38, 30), (20, 20)]),
+                LineString([(20, 20), (1, 2)])]
+        mv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [i for i in range(0, len(mv_lines))],
+                "geometry": mv_lines
+            }
+        )
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": [Point((39,30))]
+            }
+        )
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), lv_mv_geo_df, df_bag_data, mv_lines_geo_df, df_hv_mv_station, GeneratorCableCase.AVG)
+        self.energy_system = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest")
+
+    def add_transformer(self, name : str, x : float, y : float) -> esdl.Transformer:
+        # Like the network builders the x coordinate is stored in lat and the y coordinate in lon
+        transformer = esdl.Transformer(id=name, name=name)
+        transformer.geometry = esdl.Point(lat=float(x), lon=float(y), CRS="WGS84")
+        self.energy_system.instance[0].area.asset.append(transformer)
+        return transformer
+
+    def test_first_transformer_in_range_is_found(self):
+        # Arrange
+        first_transformer = self.add_transformer("first", 100, 100)
+        self.add_transformer("second", 100, 100)
+        parser = EsdlNetworkParser(energy_system=self.energy_system)
+
+        # Execute
+        transformer_index = parser._get_transformer_index_at_point(Point(100, 100))
+
+        # Assert
+        self.assertIs(parser.transformers[transformer_index], first_transformer)
+        self.assertEqual(transformer_index, parser.transformers.index(first_transformer))
+
+    def test_transformer_lookup_is_cached_per_point(self):
+        # Arrange
+        transformer = self.add_transformer("cached", 100, 100)
+        parser = EsdlNetworkParser(energy_system=self.energy_system)
+        navigation_line_string = NavigationLineString(LineString([(100, 100), (110, 100)]), False, 0)
+
+        # Execute
+        first_transformer = parser.get_transformer_connected_to_line_string(navigation_line_string)
+        # A lookup that is not answered from the cache would need the tree
+        parser.str_tree_transformers = None
+        second_transformer = parser.get_transformer_connected_to_line_string(navigation_line_string)
+
+        # Assert
+        self.assertIs(first_transformer, transformer)
+        self.assertIs(second_transformer, transformer)
+        self.assertEqual(parser.transformer_index_cache[(100.0, 100.0)], parser.transformers.index(transformer))
+
+    def test_line_without_transformer_raises(self):
+        # Arrange
+        parser = EsdlNetworkParser(energy_system=self.energy_system)
+        navigation_line_string = NavigationLineString(LineString([(110, 100), (500, 500)]), True, 0)
+
+        # Execute
+        with self.assertRaises(ValueError):
+            parser.get_transformer_connected_to_line_string(navigation_line_string)
+
+        # Assert
+        self.assertEqual(parser._get_transformer_index_at_point(Point(500, 500)), -1)
+        self.assertListEqual(parser.extract_lv_lines_connected_to_mv_lv_station_at_point(Point(500, 500)), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
+from typing import List, Tuple
+import os
+import tempfile
 import unittest
 import geopandas
 
-from shapely import LineString, Point
+from shapely import LineString, MultiLineString, Point, Polygon, STRtree, distance
 from Topology_Generator.AllianderGeoDataNetworkParser import AllianderGeoDataNetworkParser
+from Topology_Generator.BagBuildingData import BagBuildingData, BagUsagePurpose
+from Topology_Generator.BagBuildingStore import BagBuildingStore
 from Topology_Generator.EnexisGeoDataNetworkParser import EnexisGeoDataNetworkParser
+from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
+from Topology_Generator.NetworkDataReader import NetworkDataReader
+from Topology_Generator.ParsedNetworkCache import ParsedNetworkCache
 from Topology_Generator.dataclasses import NavigationLineString
 
 class TestGeoDataNetworkParser(unittest.TestCase):
@@ -63,5 +71,488 @@ class TestGeoDataNetworkParser(unittest.TestCase):
         self.assertEqual(len(starting_points[0].starting_lines), 2)
         self.assertListEqual(starting_points[0].starting_lines, [NavigationLineString(line_1, False, 0), NavigationLineString(line_2, False, 1)])
 
+    def test_lines_with_close_start_and_end_coords_are_deduplicated(self):
+        # Arrange
+        line_1 = LineString([(2,1), (3,1)])
+        line_2 = LineString([(2.01,1.01), (2.5,1.5), (2.99,1)])
+        line_3 = LineString([(3,1.02), (2,0.98)])
+        line_4 = LineString([(2,1), (3,1.05)])
+        line_5 = LineString([(4,1), (5,1)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": Point(0,1)
+            }
+        )
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3, 4],
+                "geometry": [line_1, line_2, line_3, MultiLineString([line_4, line_5])]
+            }
+        )
+
+        # Execute
+        network_parser = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df)
+
+        # Assert
+        self.assertListEqual(network_parser.all_lv_lines, [line_1, line_4, line_5])
+        self.assertIs(network_parser.all_lv_lines, network_parser.all_lv_lines)
+        self.assertEqual(network_parser.lv_line_store.get_end_coords(NavigationLineString(None, False, 1)), line_4.coords[-1])
+
+    def test_residential_buildings_are_assigned_to_nearest_lv_line(self):
+        # Arrange
+        line_1 = LineString([(2,1), (3,1)])
+        line_2 = LineString([(3,1), (5,1)])
+        line_3 = LineString([(30,1), (50,1)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": Point(0,1)
+            }
+        )
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3],
+                "geometry": [line_1, line_2, line_3]
+            }
+        )
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3, 4],
+                "geometry": [Polygon([(3.5, 1.5), (4.5, 1.5), (4.5, 2.5), (3.5, 2.5)]),
+                             Polygon([(2.1, 1.1), (2.9, 1.1), (2.9, 2.1), (2.1, 2.1)]),
+                             Polygon([(3.1, 1.1), (3.9, 1.1), (3.9, 2.1), (3.1, 2.1)]),
+                             Polygon([(10, 10), (11, 10), (11, 11), (10, 11)])],
+                "gebruiksdoel" : ["woonfunctie", "woonfunctie,industriefunctie", "industriefunctie", "woonfunctie"]
+            }
+        )
+
+        # Execute
+        network_parser = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df, bag_data_geo_df)
+
+        # Assert
+        self.assertListEqual([network_parser.get_amount_of_connections_bordering_line(i) for i in range(3)], [1, 2, 0])
+
+    def test_building_years_are_looked_up_for_all_points_at_once(self):
+        # Arrange
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(1,1), Point(20,20)]
+            }
+        )
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]), Polygon([(4, 0), (6, 0), (6, 2), (4, 2)])],
+                "bouwjaar" : [2003, 1984]
+            }
+        )
+
+        # Execute
+        network_parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), lv_mv_geo_df, bag_data_geo_df)
+        building_years = network_parser.get_building_years_of_buildings_at_points([Point(5,1), Point(10,10), Point(1,1)])
+
+        # Assert
+        self.assertListEqual(building_years.tolist(), [1984, 1, 2003])
+        self.assertListEqual(network_parser.lv_mv_station_building_years.tolist(), [2003, 1])
+        self.assertEqual(network_parser.get_building_year_of_transformer_house_at_point(Point(1,2)), 2003)
+
+    def test_parsed_network_state_is_restored_from_cache(self):
+        # Arrange
+        line_1 = LineString([(2,1), (3,1)])
+        line_2 = LineString([(1,2), (1,3)])
+        line_3 = LineString([(3,1), (5,1)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "name": ["station 1"],
+                "geometry": Point(0,1)
+            },
+            crs="EPSG:28992"
+        )
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3],
+                "geometry": [line_1, line_2, line_3]
+            }
+        )
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": [Polygon([(3.5, 1.5), (4.5, 1.5), (4.5, 2.5), (3.5, 2.5)])],
+                "bouwjaar" : [1984],
+                "gebruiksdoel" : ["woonfunctie"]
+            }
+        )
+
+        with tempfile.TemporaryDirectory() as cache_directory:
+            input_file = os.path.join(cache_directory, "lines.gpkg")
+            with open(input_file, "w") as file:
+                file.write("lines")
+            cache = ParsedNetworkCache(os.path.join(cache_directory, "cache"))
+
+            # Execute
+            cold_parser = cache.get_parser(AllianderGeoDataNetworkParser, [input_file], (0, 0, 10, 10), lambda: AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df, bag_data_geo_df))
+            warm_parser = cache.get_parser(AllianderGeoDataNetworkParser, [input_file], (0, 0, 10, 10), lambda: self.fail("Parser should be loaded from the cache"))
+
+            # Assert
+            self.assertListEqual(warm_parser.all_lv_lines, cold_parser.all_lv_lines)
+            self.assertListEqual(warm_parser.lv_line_amount_of_connections.tolist(), [0, 0, 1])
+            self.assertEqual(warm_parser.get_building_year_of_building_at_point(Point(4, 2)), 1984)
+            self.assertListEqual(warm_parser.extract_lv_lines_connected_to_mv_lv_station()[0].starting_lines, cold_parser.extract_lv_lines_connected_to_mv_lv_station()[0].starting_lines)
+            self.assertListEqual(warm_parser.geo_df_lv_mv_station["id"].tolist(), [1])
+            self.assertListEqual(warm_parser.geo_df_lv_mv_station["name"].tolist(), ["station 1"])
+            self.assertEqual(warm_parser.geo_df_lv_mv_station.crs, lv_mv_geo_df.crs)
+
+    def test_bag_data_is_read_as_typed_arrays(self):
+        # Arrange
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]), Polygon([(4, 0), (6, 0), (6, 2), (4, 2)]), Polygon([(8, 0), (10, 0), (10, 2), (8, 2)])],
+                "bouwjaar" : [2003, 1984, None],
+                "gebruiksdoel" : ["woonfunctie", "woonfunctie,industriefunctie", None],
+                "status" : ["Pand in gebruik", "Pand in gebruik", "Pand gesloopt"]
+            },
+            crs="EPSG:28992"
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            bag_data_gpkg = os.path.join(directory, "bag-data.gpkg")
+            bag_data_geo_df.to_file(bag_data_gpkg, layer="pand")
+
+            # Execute
+            bag_building_data = BagBuildingData.read_file(bag_data_gpkg, layer="pand", bbox=(0, 0, 7, 2))
+            network_parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), geopandas.GeoDataFrame(), bag_building_data)
+
+        # Assert
+        self.assertListEqual(bag_building_data.building_years.tolist(), [2003, 1984])
+        self.assertListEqual(bag_building_data.get_usage_purpose_mask(BagUsagePurpose.RESIDENTIAL).tolist(), [True, True])
+        self.assertListEqual(bag_building_data.get_usage_purpose_mask(BagUsagePurpose.INDUSTRY).tolist(), [False, True])
+        self.assertTrue(network_parser.is_there_industry_at_point(Point(5, 1)))
+        self.assertFalse(network_parser.is_there_industry_at_point(Point(-20, 1)))
+
+    def test_bag_queries_on_building_store_match_in_memory_bag_data(self):
+        # Arrange
+        line_1 = LineString([(2,1), (3,1)])
+        line_2 = LineString([(3,1), (5,1)])
+        line_3 = LineString([(300,1), (500,1)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(1,1), Point(250,250)]
+            }
+        )
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3],
+                "geometry": [line_1, line_2, line_3]
+            }
+        )
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3, 4],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]),
+                             Polygon([(3.5, 1.5), (4.5, 1.5), (4.5, 2.5), (3.5, 2.5)]),
+                             Polygon([(350, 5), (450, 5), (450, 250), (350, 250)]),
+                             Polygon([(600, 600), (610, 600), (610, 610), (600, 610)])],
+                "bouwjaar" : [2003, 1984, 1960, 2020],
+                "gebruiksdoel" : ["woonfunctie", "woonfunctie", "woonfunctie,industriefunctie", "woonfunctie"]
+            }
+        )
+        bag_building_data = BagBuildingData.from_geo_data_frame(bag_data_geo_df)
+        points = [Point(1,1), Point(4,2), Point(400,100), Point(700,700)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Execute
+            bag_building_store = BagBuildingStore.write(directory, bag_building_data, cell_size=50.0)
+            parser_in_memory = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df, bag_building_data)
+            parser_with_store = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df, bag_building_store)
+
+            # Assert
+            self.assertListEqual(parser_with_store.get_building_years_of_buildings_at_points(points).tolist(), [2003, 1984, 1960, 1])
+            self.assertListEqual(parser_with_store.get_building_years_of_buildings_at_points(points).tolist(), parser_in_memory.get_building_years_of_buildings_at_points(points).tolist())
+            self.assertListEqual(parser_with_store.lv_line_amount_of_connections.tolist(), [1, 1, 1])
+            self.assertListEqual(parser_with_store.lv_line_amount_of_connections.tolist(), parser_in_memory.lv_line_amount_of_connections.tolist())
+            self.assertTrue(parser_with_store.is_there_industry_at_point(Point(460, 100)))
+            self.assertFalse(parser_with_store.is_there_industry_at_point(Point(480, 100)))
+
+    def test_building_store_skips_empty_geometries(self):
+        # Arrange
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2, 3],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]), Polygon(), Polygon([(120, 0), (122, 0), (122, 2), (120, 2)])],
+                "bouwjaar" : [2003, 1984, 1960],
+                "gebruiksdoel" : ["woonfunctie", "woonfunctie", "woonfunctie"]
+            }
+        )
+        bag_building_data = BagBuildingData.from_geo_data_frame(bag_data_geo_df)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Execute
+            bag_building_store = BagBuildingStore.write(directory, bag_building_data, cell_size=50.0)
+            geometry_indices, building_indices = bag_building_store.get_building_indices_at_geometries([Point(1,1), Point(), LineString([(1,1), (121,1)])])
+
+            # Assert
+            self.assertListEqual(geometry_indices.tolist(), [0, 2, 2])
+            self.assertListEqual(building_indices.tolist(), [0, 0, 2])
+            self.assertListEqual(bag_building_store.get_building_indices_in_bounds((-10, -10, 200, 200)).tolist(), [0, 2])
+            self.assertListEqual([geometry.is_empty for geometry in bag_building_store.get_geometries([2, 1, 0])], [False, True, False])
+
+    def test_network_layers_are_read_once_for_multiple_bboxes(self):
+        # Arrange
+        layers = {
+            "laagspanningskabels" : [LineString([(2,1), (3,1)]), LineString([(102,1), (103,1)])],
+            "middenspanningsinstallaties" : [Point(1,1), Point(101,1)],
+            "middenspanningskabels" : [LineString([(1,1), (1,5)])],
+            "onderstations" : [Point(200,200)],
+        }
+        bag_data_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]), Polygon([(100, 0), (102, 0), (102, 2), (100, 2)])],
+                "bouwjaar" : [2003, 1984],
+                "gebruiksdoel" : ["woonfunctie", "industriefunctie"],
+            },
+            crs="EPSG:28992"
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            network_data_gpkg = os.path.join(directory, "network.gpkg")
+            bag_data_gpkg = os.path.join(directory, "bag-data.gpkg")
+            for layer, geometries in layers.items():
+                geopandas.GeoDataFrame({"id" : range(len(geometries)), "geometry" : geometries}, crs="EPSG:28992").to_file(network_data_gpkg, layer=layer)
+            bag_data_geo_df.to_file(bag_data_gpkg, layer="pand")
+
+            # Execute
+            network_data = NetworkDataReader(network_data_gpkg, bag_data_gpkg).read([(0, 0, 10, 10), (100, 0, 110, 10)])
+
+        # Assert
+        self.assertEqual(len(network_data), 2)
+        self.assertListEqual(network_data[0].lv_lines.geometry.tolist(), [layers["laagspanningskabels"][0]])
+        self.assertListEqual(network_data[1].mv_lv_stations.geometry.tolist(), [layers["middenspanningsinstallaties"][1]])
+        self.assertEqual(len(network_data[1].mv_lines), 0)
+        self.assertListEqual(list(network_data[0].lv_lines.columns), ["geometry"])
+        self.assertListEqual(network_data[0].bag_building_data.building_years.tolist(), [2003])
+        self.assertListEqual(network_data[1].bag_building_data.building_years.tolist(), [1984])
+        starting_points = NetworkDataReader.create_parser(network_data[0], AllianderGeoDataNetworkParser).extract_lv_lines_connected_to_mv_lv_station()
+        self.assertListEqual(starting_points[0].starting_lines, [NavigationLineString(layers["laagspanningskabels"][0], False, 0)])
+
+    def test_bbox_views_share_the_region_data_and_start_from_their_own_stations(self):
+        # Arrange
+        line_1 = LineString([(2,1), (3,1)])
+        line_2 = LineString([(102,1), (103,1)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(1,1), Point(101,1)]
+            }
+        )
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [line_1, line_2]
+            }
+        )
+        region_parser = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df)
+
+        # Execute
+        view_1 = region_parser.create_bbox_view((0, 0, 10, 10))
+        view_2 = region_parser.create_bbox_view((100, 0, 110, 10))
+        view_1_starting_points = view_1.extract_lv_lines_connected_to_mv_lv_station()
+        view_2_starting_points = view_2.extract_lv_lines_connected_to_mv_lv_station()
+
+        # Assert
+        self.assertIs(view_1.str_tree_lv_lines, region_parser.str_tree_lv_lines)
+        self.assertIs(view_2.lv_line_incidence_index, region_parser.lv_line_incidence_index)
+        self.assertEqual(len(region_parser.extract_lv_lines_connected_to_mv_lv_station()), 2)
+        self.assertEqual(len(view_1_starting_points), 1)
+        self.assertListEqual(view_1_starting_points[0].starting_lines, [NavigationLineString(line_1, False, 0)])
+        self.assertEqual(len(view_2_starting_points), 1)
+        self.assertListEqual(view_2_starting_points[0].starting_lines, [NavigationLineString(line_2, False, 1)])
+        self.assertEqual(view_2.get_lv_mv_station_index_at_point(Point(1,1), 3.0), 0)
+
+    def test_lines_continuing_another_starting_line_are_removed(self):
+        # Arrange
+        line_1 = LineString([(0,0), (1,0)])
+        line_2 = LineString([(1,0), (2,0)])
+        line_3 = LineString([(0,0), (0,1)])
+        closed_line = LineString([(3,0), (4,1), (3,0)])
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": Point(0,0)
+            }
+        )
+        starting_lines = [NavigationLineString(line_2, False, 1), NavigationLineString(line_1, False, 0), NavigationLineString(line_3, False, 2), NavigationLineString(closed_line, False, 3)]
+
+        # Execute
+        network_parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), lv_mv_geo_df)
+        network_parser.remove_duplicate_and_non_connected_lines(Point(0,0), starting_lines)
+
+        # Assert
+        self.assertListEqual(starting_lines, [NavigationLineString(line_1, False, 0), NavigationLineString(line_3, False, 2), NavigationLineString(closed_line, False, 3)])
+
+    def test_lines_of_an_unknown_tree_are_not_looked_up_in_the_lv_structures(self):
+        # Arrange
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [LineString([(2,1), (3,1)]), LineString([(1,2), (1,3)])]
+            }
+        )
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1],
+                "geometry": Point(0,1)
+            }
+        )
+        network_parser = AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df)
+        rebuilt_str_tree = STRtree(network_parser.lv_line_store.geometries)
+
+        # Execute
+        with self.assertRaises(ValueError):
+            network_parser.extract_lines_connected_to_2d_entity_include_both_sides_disconnected(rebuilt_str_tree, 10.0, Point(0,1))
+
+        # Assert
+        self.assertIs(network_parser.get_line_store(network_parser.str_tree_lv_lines), network_parser.lv_line_store)
+
+    def get_lines_connected_to_station_per_station(self, str_tree_lines : STRtree, touch_margin : float, station : Point, include_both_sides_disconnected : bool) -> List[Tuple[int, bool]]:
+        # The rule the bulk join replaces, applied to one station at a time
+        ret_val = []
+        for index in str_tree_lines.query(station, 'dwithin', touch_margin).tolist():
+            line = str_tree_lines.geometries.take(index)
+            amount_of_lines_connecting_first_point = str_tree_lines.query(Point(line.coords[0]), 'touches').size
+            amount_of_lines_connecting_last_point = str_tree_lines.query(Point(line.coords[-1]), 'touches').size
+            if amount_of_lines_connecting_first_point > 1 and amount_of_lines_connecting_last_point > 1:
+                continue
+            if include_both_sides_disconnected:
+                first_point_touches_station = GeometryHelperFunctions.points_are_close(line.coords[0], (station.x, station.y), touch_margin)
+                last_point_touches_station = GeometryHelperFunctions.points_are_close(line.coords[-1], (station.x, station.y), touch_margin)
+                if first_point_touches_station and last_point_touches_station:
+                    ret_val.append((index, distance(Point(line.coords[0]), station) > distance(Point(line.coords[-1]), station)))
+                elif first_point_touches_station or last_point_touches_station:
+                    ret_val.append((index, not first_point_touches_station))
+            else:
+                first_point_touches_station = amount_of_lines_connecting_first_point == 1
+                last_point_touches_station = amount_of_lines_connecting_last_point == 1
+                if not (first_point_touches_station and last_point_touches_station):
+                    ret_val.append((index, not first_point_touches_station))
+        return ret_val
+
+    def create_station_join_parser(self) -> AllianderGeoDataNetworkParser:
+        lv_lines = [LineString([(1, 0), (0, 2)]),
+                    LineString([(0, 2.5), (0.5, 0)]),
+                    LineString([(2, 0.5), (8, 0.5)]),
+                    LineString([(0, -1), (0, -10)]),
+                    LineString([(0, -10), (5, -10)]),
+                    LineString([(0, -10), (-5, -10)]),
+                    LineString([(10, -1), (10, -10)]),
+                    LineString([(10, -1), (14, -1)]),
+                    LineString([(10, -10), (15, -10)]),
+                    LineString([(11, 0), (11, 5)]),
+                    LineString([(9, 1), (9, 6)]),
+                    LineString([(9, 6), (4, 6)])]
+        lv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [i for i in range(0, len(lv_lines))],
+                "geometry": lv_lines
+            }
+        )
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(0,0), Point(10,0)]
+            }
+        )
+        return AllianderGeoDataNetworkParser(lv_lines_geo_df, lv_mv_geo_df)
+
+    def test_bulk_station_join_matches_per_station_rule(self):
+        # Arrange
+        # Two lines have both ends near the station at (0,0), one line runs from that station to the station at (10,0),
+        # one line is connected to other lines on both sides and one line is not connected to any other line
+        network_parser = self.create_station_join_parser()
+        stations = network_parser.geo_df_lv_mv_station
+        building_years = network_parser.lv_mv_station_building_years
+
+        # Execute
+        both_sides_disconnected = network_parser.extract_lines_connected_to_stations_include_both_sides_disconnected(stations, network_parser.str_tree_lv_lines, 3.0, building_years)
+        one_side_connected = network_parser.extract_lines_connected_to_stations_include_one_side_connected(stations, network_parser.str_tree_lv_lines, 3.0, building_years)
+
+        # Assert
+        for include_both_sides_disconnected, containers in [(True, both_sides_disconnected), (False, one_side_connected)]:
+            self.assertListEqual([[(line.index, line.first_point_end) for line in container.starting_lines] for container in containers],
+                                 [self.get_lines_connected_to_station_per_station(network_parser.str_tree_lv_lines, 3.0, station, include_both_sides_disconnected) for station in stations.geometry])
+
+    def test_bulk_station_join_connects_lines_at_the_nearest_station_side(self):
+        # Arrange
+        network_parser = self.create_station_join_parser()
+        stations = network_parser.geo_df_lv_mv_station
+        building_years = network_parser.lv_mv_station_building_years
+
+        # Execute
+        both_sides_disconnected = network_parser.extract_lines_connected_to_stations_include_both_sides_disconnected(stations, network_parser.str_tree_lv_lines, 3.0, building_years)
+        one_side_connected = network_parser.extract_lines_connected_to_stations_include_one_side_connected(stations, network_parser.str_tree_lv_lines, 3.0, building_years)
+
+        # Assert
+        get_line_info = lambda containers : [sorted((line.index, line.first_point_end) for line in container.starting_lines) for container in containers]
+        # With both ends near the station the line connects with its nearest end, the line between both stations connects to both
+        self.assertListEqual(get_line_info(both_sides_disconnected), [[(0, False), (1, True), (2, False), (3, False)], [(2, True), (7, False), (9, False), (10, False)]])
+        # Lines without any other line at either end are only included with the flag, without it the side of a line is its connected side
+        self.assertListEqual(get_line_info(one_side_connected), [[(3, False)], [(7, True), (10, False)]])
+
+    def test_hv_station_starting_lines_are_filtered_like_per_station(self):
+        # Arrange
+        # Both hv stations are within the margin of the feeders along the x and y axis, the feeder along the y axis starts at the
+        # two overlapping mv-lv stations at the first hv station and the line at x = 60 does not end at a building
+        mv_lines = [LineString([(5, 0), (60, 0)]),
+                    LineString([(60, 0), (60, 60)]),
+                    LineString([(0, -2), (0, -80)]),
+                    LineString([(0, -80), (30, -80)])]
+        mv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [i for i in range(0, len(mv_lines))],
+                "geometry": mv_lines
+            }
+        )
+        hv_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(0,0), Point(30,0)]
+            }
+        )
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point(0,0), Point(0,-1)]
+            }
+        )
+        bag_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Polygon([(4, -1), (6, -1), (6, 1), (4, 1)]), Polygon([(-1, -3), (1, -3), (1, -1), (-1, -1)])],
+                "bouwjaar" : [2003, 1984]
+            }
+        )
+        network_parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), lv_mv_geo_df, bag_df, mv_lines_geo_df, hv_df)
+        geo_df_stations, building_years = network_parser.get_starting_hv_stations()
+        unfiltered = network_parser.extract_lines_connected_to_stations_include_one_side_connected(geo_df_stations, network_parser.str_tree_mv_lines, 50.0, building_years)
+
+        # Execute
+        filtered = network_parser.extract_mv_lines_connected_to_hv_mv_station()
+
+        # Assert
+        self.assertListEqual([sorted(line.index for line in ret_val.starting_lines) for ret_val in unfiltered], [[0, 2], [0, 1, 2]])
+        self.assertListEqual([[line.index for line in ret_val.starting_lines] for ret_val in filtered], [[0], [0]])
+        # The rule the batched masks replace, applied to the lines of one station at a time
+        for ret_val, filtered_ret_val in zip(unfiltered, filtered):
+            expected_lines = [line for line in ret_val.starting_lines if network_parser.get_building_year_of_building_at_point(Point(line.line_string.coords[0])) != 1 or network_parser.get_building_year_of_building_at_point(Point(line.line_string.coords[-1])) != 1]
+            expected_lines = [line for line in expected_lines if not any(len(network_parser.extract_mv_lines_connected_to_mv_lv_station_at_point(Point(coords))) > 0 for coords in [line.line_string.coords[0], line.line_string.coords[-1]])]
+            self.assertListEqual(filtered_ret_val.starting_lines, expected_lines)
+        # Of the overlapping mv-lv stations the first one in the data frame is the station at the start of the feeder
+        self.assertListEqual(network_parser.get_lv_mv_station_indices_at_points([Point(0, -2), Point(5, 0)], 3.0).tolist(), [0, -1])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+from typing import List
+import unittest
+import numpy as np
+from shapely import LineString, Point, STRtree
+
+from Topology_Generator.GeometryHelperFunctions import GeometryHelperFunctions
+from Topology_Generator.LineIncidenceIndex import LineIncidenceIndex
+from Topology_Generator.LineStore import LineStore
+from Topology_Generator.dataclasses import NavigationLineString
+
+class TestLineIncidenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        # A T-junction at (1,0), a node at (2,0) shared by two lines and a closed line and a dead end at (3,0)
+        self.lines = [LineString([(0, 0), (1, 0)]),
+                      LineString([(1, 0), (2, 0)]),
+                      LineString([(1, 1), (1, 0)]),
+                      LineString([(2, 0), (3, 1), (2, 0)]),
+                      LineString([(2, 0), (3, 0)])]
+        self.line_store = LineStore.from_lines(self.lines)
+
+    def get_next_lines_with_str_tree(self, str_tree_lines : STRtree, navigation_line_string : NavigationLineString) -> List[NavigationLineString]:
+        # The lookup the incidence index replaces: a touches query on the end point of the line
+        point_to_connect_to = Point(navigation_line_string.line_string.coords[0]) if navigation_line_string.first_point_end else Point(navigation_line_string.line_string.coords[-1])
+        intersecting_indices = np.setdiff1d(str_tree_lines.query(point_to_connect_to, 'touches'), np.array([navigation_line_string.index]))
+        ret_val = []
+        for index in intersecting_indices:
+            next_line_string_end_pair = GeometryHelperFunctions.line_string_connected_to_point(point_to_connect_to, str_tree_lines.geometries.take(index), index)
+            if next_line_string_end_pair != None:
+                ret_val.append(next_line_string_end_pair)
+        return ret_val
+
+    def test_next_lines_match_str_tree_touches_query(self):
+        # Arrange
+        line_incidence_index = LineIncidenceIndex(self.line_store)
+        str_tree_lines = STRtree(self.lines)
+
+        for index in range(len(self.lines)):
+            for first_point_end in [False, True]:
+                navigation_line_string = NavigationLineString(self.lines[index], first_point_end, index)
+
+                # Execute
+                next_lines = line_incidence_index.get_next_lines(navigation_line_string)
+
+                # Assert
+                expected_next_lines = self.get_next_lines_with_str_tree(str_tree_lines, navigation_line_string)
+                self.assertListEqual([(next_line.index, next_line.first_point_end) for next_line in next_lines],
+                                     [(next_line.index, next_line.first_point_end) for next_line in expected_next_lines])
+
+    def test_next_lines_at_a_shared_node(self):
+        # Arrange
+        line_incidence_index = LineIncidenceIndex(self.line_store)
+
+        # Execute
+        next_lines_from_first_line = line_incidence_index.get_next_lines(NavigationLineString(self.lines[0], False, 0))
+        next_lines_from_last_line = line_incidence_index.get_next_lines(NavigationLineString(self.lines[4], True, 4))
+
+        # Assert
+        # Line 1 starts at the junction so its last point is the end to continue from, line 2 ends at the junction
+        self.assertListEqual([(next_line.index, next_line.first_point_end) for next_line in next_lines_from_first_line], [(1, False), (2, True)])
+        self.assertEqual(next_lines_from_first_line[1].line_string, self.lines[2])
+        # The closed line through (2,0) is not incident to the node
+        self.assertListEqual([(next_line.index, next_line.first_point_end) for next_line in next_lines_from_last_line], [(1, True)])
+
+    def test_endpoint_degrees_count_the_lines_at_both_ends(self):
+        # Arrange / Execute
+        line_incidence_index = LineIncidenceIndex(self.line_store)
+
+        # Assert
+        self.assertListEqual(line_incidence_index.endpoint_degrees.tolist(), [[1, 3], [3, 2], [1, 3], [2, 2], [2, 1]])
+        self.assertListEqual(list(line_incidence_index.get_incident_lines(line_incidence_index.get_end_node(0, False))), [(0, False), (1, True), (2, False)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,19 @@
 from typing import List
+import os
+import tempfile
 import unittest
+import xml.etree.ElementTree as ElementTree
 import esdl
 import geopandas
 from shapely import LineString, Polygon, Point
 
 from Topology_Generator.AllianderGeoDataNetworkParser import AllianderGeoDataNetworkParser
+from Topology_Generator.EsdlFileWriter import EsdlFileWriter
 from Topology_Generator.EsdlHelperFunctions import EsdlHelperFunctions
 from Topology_Generator.GeoDataNetworkParser import GeneratorCableCase
-from Topology_Generator.MvNetworkBuilder import MvNetworkBuilder
+from Topology_Generator.MvNetworkBuilder import MvNetworkBuilder, MvNetworkOutput, MvTraversalEngine
+from Topology_Generator.TiledMvNetworkGenerator import TiledMvNetworkGenerator
+from Topology_Generator.dataclasses import MvCableRecord
 
 class TestLvNetworkBuilder(unittest.TestCase):
 
@@ -48,6 +54,13 @@ class TestLvNetworkBuilder(unittest.TestCase):
             }
         )
 
+    def get_esdl_element_info(self, element : ElementTree.Element):
+        # The order of the features of an object differs between serializers, the order of the objects of one feature does not
+        children = {}
+        for child in element:
+            children.setdefault(child.tag, []).append(self.get_esdl_element_info(child))
+        return (element.tag, sorted(element.attrib.items()), sorted(children.items()))
+
     def esdl_cable_geometry_equal(self, cable_a : esdl.Line, cable_b : esdl.Line):
         for point_a in cable_a.point:
             not_present = True
@@ -174,5 +187,293 @@ class TestLvNetworkBuilder(unittest.TestCase):
         self.assertEqual(transformers[0].commissioningDate.year, 1984)
         self.assertEqual(transformers[1].commissioningDate.year, 2003)
 
+    def test_mv_network_found_in_multiple_tiles_is_generated_once(self):
+        # Arrange
+        def parser_factory(bbox):
+            return AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        tiled_generator = TiledMvNetworkGenerator(parser_factory, (0, 0, 50, 50), 25, 30)
+
+        # Execute
+        mv_networks = list(tiled_generator.generate_mv_networks("unittest"))
+
+        # Assert
+        self.assertEqual(len(tiled_generator.get_tiles()), 4)
+        self.assertEqual(len(mv_networks), 1)
+        electricity_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(mv_networks[0].instance[0].area.asset, esdl.ElectricityCable)
+        self.assertEqual(len(electricity_cables), 6)
+
+    def test_failing_mv_network_does_not_end_its_tile(self):
+        # Arrange
+        df_hv_mv_stations = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point((1,1)), Point((1,1))]
+            }
+        )
+        class FirstRingFailingParser(AllianderGeoDataNetworkParser):
+            def define_cable_type_based_on_year(self, building_year, generator_cable_case : GeneratorCableCase = None):
+                if not hasattr(self, "failed"):
+                    self.failed = True
+                    raise ValueError("Unknown cable type")
+                return super().define_cable_type_based_on_year(building_year, generator_cable_case)
+        def parser_factory(bbox):
+            return FirstRingFailingParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, df_hv_mv_stations, GeneratorCableCase.AVG)
+        tiled_generator = TiledMvNetworkGenerator(parser_factory, (0, 0, 50, 50), 50, 0)
+
+        # Execute
+        mv_networks = list(tiled_generator.generate_mv_networks("unittest"))
+
+        # Assert
+        self.assertListEqual([mv_network.name for mv_network in mv_networks], ["unittest-0-1.0"])
+        with self.assertRaises(ValueError):
+            list(MvNetworkBuilder(parser_factory(None), 0, 0, 50, 50).iter_mv_networks("unittest"))
+
+    def test_iterative_and_recursive_traversal_build_the_same_mv_network(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        iterative_network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50, MvTraversalEngine.ITERATIVE)
+        recursive_network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50, MvTraversalEngine.RECURSIVE)
+
+        # Execute
+        iterative_assets = iterative_network_builder.generate_a_mv_network("unittest").instance[0].area.asset
+        recursive_assets = recursive_network_builder.generate_a_mv_network("unittest").instance[0].area.asset
+
+        # Assert
+        self.assertListEqual([(type(asset), asset.name, asset.assetType, asset.commissioningDate) for asset in iterative_assets],
+                             [(type(asset), asset.name, asset.assetType, asset.commissioningDate) for asset in recursive_assets])
+
+    def test_iterative_and_recursive_traversal_build_the_same_records_for_branching_feeders(self):
+        # Arrange
+        # The feeder branches at the stations at (31,1) and (61,1), the station at (31,1) has a dead end spur and the station at (61,1) a dead end
+        # branch that is followed before the branch of the ring. The ring is reachable from both starting lines at the hv station.
+        mv_lines = [LineString([(2, 1), (15, 1)]),
+                    LineString([(15, 1), (30, 1)]),
+                    LineString([(32, 1), (45, 1)]),
+                    LineString([(45, 1), (60, 1)]),
+                    LineString([(31, 2), (31, 10)]),
+                    LineString([(31, 10), (31, 20)]),
+                    LineString([(62, 1), (75, 1)]),
+                    LineString([(75, 1), (90, 1)]),
+                    LineString([(61, 2), (61, 40)]),
+                    LineString([(61, 40), (20, 40)]),
+                    LineString([(20, 40), (1, 2)])]
+        mv_lines_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [i for i in range(0, len(mv_lines))],
+                "geometry": mv_lines
+            }
+        )
+        lv_mv_geo_df = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point((31,1)), Point((61,1))]
+            }
+        )
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), lv_mv_geo_df, self.df_bag_data, mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        starting_lines_container = parser.extract_mv_lines_connected_to_hv_mv_station()[0]
+        get_record_info = lambda record : (record.line_index, record.from_node.name, record.to_node.name, record.segment.cable_type_year, record.segment.commissioning_year) if isinstance(record, MvCableRecord) else (record.node_type, record.name, record.coords, record.commissioning_year)
+        def find_records(traversal_engine : MvTraversalEngine) -> List[list]:
+            network_builder = MvNetworkBuilder(parser, 0, 0, 100, 100, traversal_engine)
+            default_loops_mapping = network_builder._get_default_loops_mapping(starting_lines_container)
+            mv_rings = [network_builder._find_mv_ring("unittest", starting_line, starting_lines_container.building_year, default_loops_mapping, set()) for starting_line in starting_lines_container.starting_lines]
+            return [[get_record_info(record) for record in mv_ring.records] for mv_ring in mv_rings]
+        get_asset_info = lambda mv_network : [(type(asset), asset.name, asset.assetType, asset.commissioningDate) for asset in mv_network.instance[0].area.asset]
+
+        # Execute
+        iterative_records = find_records(MvTraversalEngine.ITERATIVE)
+        recursive_records = find_records(MvTraversalEngine.RECURSIVE)
+        iterative_mv_networks = list(MvNetworkBuilder(parser, 0, 0, 100, 100, MvTraversalEngine.ITERATIVE).iter_mv_networks("unittest"))
+        recursive_mv_networks = list(MvNetworkBuilder(parser, 0, 0, 100, 100, MvTraversalEngine.RECURSIVE).iter_mv_networks("unittest"))
+
+        # Assert
+        self.assertEqual(len(iterative_records), 2)
+        self.assertListEqual(iterative_records, recursive_records)
+        self.assertListEqual([record_info[0] for record_info in iterative_records[0] if len(record_info) == 5], [0, 1, 2, 3, 8, 9, 10])
+        self.assertListEqual([record_info[0] for record_info in iterative_records[1] if len(record_info) == 5], [10, 9, 8, 3, 2, 1, 0])
+        self.assertEqual(len(iterative_mv_networks), 1)
+        self.assertListEqual([get_asset_info(mv_network) for mv_network in iterative_mv_networks], [get_asset_info(mv_network) for mv_network in recursive_mv_networks])
+
+    def test_all_mv_networks_are_iterated_in_one_pass(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50)
+        expected_network_names = []
+        while True:
+            try:
+                expected_network_names.append(network_builder.generate_a_mv_network("unittest").name)
+            except ValueError:
+                break
+
+        # Execute
+        mv_networks = list(MvNetworkBuilder(parser, 0, 0, 50, 50).iter_mv_networks("unittest"))
+
+        # Assert
+        self.assertEqual(len(mv_networks), 1)
+        self.assertListEqual([mv_network.name for mv_network in mv_networks], expected_network_names)
+
+    def test_mv_networks_generated_in_process_pool_match_sequential_run(self):
+        # Arrange
+        df_hv_mv_stations = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point((1,1)), Point((1,1))]
+            }
+        )
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, df_hv_mv_stations, GeneratorCableCase.AVG)
+
+        # Execute
+        sequential_mv_networks = list(MvNetworkBuilder(parser, 0, 0, 50, 50).iter_mv_networks("unittest"))
+        parallel_mv_networks = list(MvNetworkBuilder(parser, 0, 0, 50, 50).iter_mv_networks("unittest", processes=2))
+
+        # Assert
+        self.assertEqual(len(parallel_mv_networks), 2)
+        self.assertListEqual([mv_network.name for mv_network in parallel_mv_networks], [mv_network.name for mv_network in sequential_mv_networks])
+        for sequential_mv_network, parallel_mv_network in zip(sequential_mv_networks, parallel_mv_networks):
+            self.assertListEqual([(asset.name, asset.assetType, asset.commissioningDate) for asset in parallel_mv_network.instance[0].area.asset],
+                                 [(asset.name, asset.assetType, asset.commissioningDate) for asset in sequential_mv_network.instance[0].area.asset])
+
+    def test_mv_network_assets_are_only_connected_to_assets_of_the_network(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50)
+
+        # Execute
+        mv_network = network_builder.generate_a_mv_network("unittest")
+
+        # Assert
+        assets = mv_network.instance[0].area.asset
+        network_ports = set(port.id for asset in assets for port in asset.port)
+        connected_ports = set(connected_port.id for asset in assets for port in asset.port for connected_port in port.connectedTo)
+        self.assertEqual(len(EsdlHelperFunctions.get_all_esdl_objects_from_type(assets, esdl.ElectricityCable)), 6)
+        self.assertTrue(connected_ports.issubset(network_ports))
+
+    def test_cables_between_transformers_get_the_cable_type_of_their_segment(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50)
+
+        # Execute
+        mv_network = network_builder.generate_a_mv_network("unittest")
+
+        # Assert
+        electricity_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(mv_network.instance[0].area.asset, esdl.ElectricityCable)
+        self.assertListEqual([(cable.name, cable.assetType, cable.commissioningDate.year) for cable in electricity_cables],
+                             [("Cable0", "XLPE-Al-150", 2003), ("Cable1", "XLPE-Al-150", 2003), ("Cable2", "GPLK-Al-150", 1984),
+                              ("Cable3", "GPLK-Al-150", 1984), ("Cable4", "XLPE-Al-150", 2003), ("Cable5", "XLPE-Al-150", 2003)])
+
+    def test_all_cable_case_variants_are_generated_from_one_traversal(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        thick_parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.THICK)
+        network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50)
+
+        # Execute
+        variants = list(network_builder.iter_mv_network_variants("unittest"))
+        thick_mv_network = MvNetworkBuilder(thick_parser, 0, 0, 50, 50).generate_a_mv_network("unittest")
+
+        # Assert
+        self.assertEqual(len(variants), 1)
+        self.assertListEqual(list(variants[0].keys()), list(GeneratorCableCase))
+        thick_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(variants[0][GeneratorCableCase.THICK].instance[0].area.asset, esdl.ElectricityCable)
+        avg_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(variants[0][GeneratorCableCase.AVG].instance[0].area.asset, esdl.ElectricityCable)
+        expected_thick_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(thick_mv_network.instance[0].area.asset, esdl.ElectricityCable)
+        self.assertListEqual([(cable.name, cable.assetType) for cable in thick_cables], [(cable.name, cable.assetType) for cable in expected_thick_cables])
+        self.assertEqual(avg_cables[0].assetType, "XLPE-Al-150")
+        self.assertEqual(thick_cables[0].assetType, "XLPE-Al-240")
+
+    def test_mv_networks_written_by_esdl_file_writer_can_be_loaded(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        mv_network = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest")
+        get_asset_info = lambda energy_system : [(type(asset).__name__, asset.name, asset.commissioningDate, [[connected_port.id for connected_port in port.connectedTo] for port in asset.port])
+                                                 for asset in energy_system.instance[0].area.asset]
+
+        # Execute
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = EsdlFileWriter().write_energy_systems([mv_network], directory) + EsdlFileWriter(compress=True).write_energy_systems([mv_network], directory)
+            loaded_mv_networks = [EsdlFileWriter.read_energy_system(file_path) for file_path in file_paths]
+
+        # Assert
+        self.assertListEqual([os.path.basename(file_path) for file_path in file_paths], [f"{mv_network.name}.esdl", f"{mv_network.name}.esdl.gz"])
+        for loaded_mv_network in loaded_mv_networks:
+            self.assertEqual(loaded_mv_network.name, mv_network.name)
+            self.assertListEqual(get_asset_info(loaded_mv_network), get_asset_info(mv_network))
+
+    def test_esdl_file_writer_writes_the_same_esdl_as_pyecore(self):
+        # Arrange
+        df_hv_mv_stations = geopandas.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "geometry": [Point((1,1)), Point((1,1))]
+            }
+        )
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, df_hv_mv_stations, GeneratorCableCase.AVG)
+        mv_networks = list(MvNetworkBuilder(parser, 0, 0, 50, 50).iter_mv_networks("unittest"))
+
+        # Execute
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = EsdlFileWriter().write_energy_systems(mv_networks, directory)
+            esdl_strings = []
+            for file_path in file_paths:
+                with open(file_path, encoding="utf-8") as file:
+                    esdl_strings.append(file.read())
+
+        # Assert
+        self.assertEqual(len(mv_networks), 2)
+        for mv_network, esdl_string in zip(mv_networks, esdl_strings):
+            self.assertEqual(self.get_esdl_element_info(ElementTree.fromstring(esdl_string)),
+                             self.get_esdl_element_info(ElementTree.fromstring(EsdlHelperFunctions.energy_system_to_string(mv_network))))
+
+    def test_esdl_file_writer_refuses_features_it_can_not_write(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        mv_network = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest")
+        cable = EsdlHelperFunctions.get_all_esdl_objects_from_type(mv_network.instance[0].area.asset, esdl.ElectricityCable)[0]
+        cable.port[0].carrier = esdl.ElectricityCommodity(id="electricity")
+        mv_network.energySystemInformation.carriers = esdl.Carriers(id="carriers")
+
+        # Execute
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                EsdlFileWriter().write_energy_system(mv_network, os.path.join(directory, "carrier.esdl"))
+            cable.port[0].carrier = None
+            with self.assertRaises(ValueError):
+                EsdlFileWriter().write_energy_system(mv_network, os.path.join(directory, "information.esdl"))
+            mv_network.energySystemInformation.carriers = None
+            EsdlFileWriter().write_energy_system(mv_network, os.path.join(directory, "written.esdl"))
+
+            # Assert
+            self.assertEqual(len(EsdlFileWriter.read_energy_system(os.path.join(directory, "written.esdl")).instance[0].area.asset), len(mv_network.instance[0].area.asset))
+
+    def test_mv_network_topology_is_generated_without_energy_system(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+
+        # Execute
+        mv_network = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest")
+        mv_ring_topology = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest", output=MvNetworkOutput.TOPOLOGY_ARRAYS)
+        network_topology_info = MvNetworkBuilder(parser, 0, 0, 50, 50).generate_a_mv_network("unittest", output=MvNetworkOutput.TOPOLOGY_GRAPH)
+
+        # Assert
+        electricity_cables = EsdlHelperFunctions.get_all_esdl_objects_from_type(mv_network.instance[0].area.asset, esdl.ElectricityCable)
+        self.assertEqual(mv_ring_topology.name, mv_network.name)
+        self.assertListEqual(mv_ring_topology.edges.tolist(), [[0, 1], [1, 2], [2, 3], [3, 4], [4, 5], [5, 0]])
+        self.assertListEqual([(f"Cable{line_index}", round(length, 6), cable_type, commissioning_year) for line_index, length, cable_type, commissioning_year in
+                              zip(mv_ring_topology.line_indices.tolist(), mv_ring_topology.lengths.tolist(), mv_ring_topology.cable_types, mv_ring_topology.commissioning_years.tolist())],
+                             [(cable.name, round(cable.length, 6), cable.assetType, cable.commissioningDate.year) for cable in electricity_cables])
+        self.assertListEqual(mv_ring_topology.node_names, ["HighVoltageTrafo", "joint0", "transformer1", "joint3", "transformer4", "joint6"])
+        self.assertEqual(len(network_topology_info.network_topology.edges), 6)
+        self.assertEqual(network_topology_info.amount_of_connections, 2)
+        self.assertAlmostEqual(network_topology_info.total_length, sum(cable.length for cable in electricity_cables))
+
+    def test_topology_output_can_not_be_saved(self):
+        # Arrange
+        parser = AllianderGeoDataNetworkParser(geopandas.GeoDataFrame(), self.lv_mv_geo_df, self.df_bag_data, self.mv_lines_geo_df, self.df_hv_mv_station, GeneratorCableCase.AVG)
+        network_builder = MvNetworkBuilder(parser, 0, 0, 50, 50)
+
+        # Execute
+        with self.assertRaises(ValueError):
+            network_builder.generate_a_mv_network("unittest", save_network=True, output=MvNetworkOutput.TOPOLOGY_GRAPH)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file